@@ -1,113 +1,383 @@
-from flask import Flask, render_template, request
+import asyncio
+import functools
+import json
+import sqlite3
 
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+
+import columnar
+import map_data
+import metrics
+import profiling
+import utils
 from utils import (
-    compute_tfidf, search_tfidf, get_db_connection, analyze_districts,
-    load_documents_cached, get_filtered_apartments, create_charts,
-    create_map, calculate_similarity_for_doc, get_all_districts
+    analyze_districts, create_charts,
+    get_all_districts, get_district_stats, decode_cursor,
+    encode_cursor, next_page_cursor
 )
+from search_index import get_tfidf_model
+from stages import run_panel, run_stage
 
 app = Flask(__name__)
+# FLASK_FILTER_ENGINE=columnar - filtry liczone na kopii kolumnowej w pamięci zamiast w SQLite
+app.config['FILTER_ENGINE'] = 'sql'
+# limity czasu (s) paneli strony; po przekroczeniu panel jest pusty albo z wartościami domyślnymi,
+# np. FLASK_STAGE_TIMEOUTS__charts=10
+app.config['STAGE_TIMEOUTS'] = {
+    'charts': 5.0,
+    'district_stats': 2.0,
+    'district_breakdown': 2.0,
+    'city_stats': 1.0,
+    'all_districts': 2.0,
+    'map': 5.0,
+}
+# FLASK_PROFILE_REQUESTS=true - request z nagłówkiem X-Profile: 1 albo parametrem profile=1 jest
+# profilowany (cProfile) do PROFILE_DIR, zostaje PROFILE_KEEP najnowszych; tylko w zaufanym środowisku
+app.config['PROFILE_REQUESTS'] = False
+app.config['PROFILE_DIR'] = 'profiles'
+app.config['PROFILE_KEEP'] = 50
+app.config.from_prefixed_env()
 
-@app.route('/', methods=['GET', 'POST'])
-def index():    
-    doc_ids, documents = load_documents_cached()
-    tfidf_docs, tokenized_docs, df_counts, N = compute_tfidf(documents)
-    
-    filters = {
-        'min_rooms': request.form.get('min_rooms', type=int),
-        'min_square': request.form.get('min_square', type=float),
-        'max_square': request.form.get('max_square', type=float),
-        'min_price': request.form.get('min_price', type=float),
-        'max_price': request.form.get('max_price', type=float),
-        'min_build_year': request.form.get('min_build_year', type=int),
-        'max_centre_distance': request.form.get('max_centre_distance', type=float),
-        'min_floor': request.form.get('min_floor', type=int),
-        'max_floor_count': request.form.get('max_floor_count', type=int),
-        'balcony': request.form.get('balcony'),
-        'elevator': request.form.get('elevator'),
-        'parking': request.form.get('parking'),
-        'district': request.form.get('district')
+def filter_engine():
+    return columnar if app.config['FILTER_ENGINE'] == 'columnar' else utils
+
+if app.config['FILTER_ENGINE'] == 'columnar':
+    try:
+        columnar.get_columns()
+    except sqlite3.Error:
+        pass
+
+def parse_filters(source):
+    """13 filtrów z formularza (request.form) albo z query stringa (request.args)"""
+    return {
+        'min_rooms': source.get('min_rooms', type=int),
+        'min_square': source.get('min_square', type=float),
+        'max_square': source.get('max_square', type=float),
+        'min_price': source.get('min_price', type=float),
+        'max_price': source.get('max_price', type=float),
+        'min_build_year': source.get('min_build_year', type=int),
+        'max_centre_distance': source.get('max_centre_distance', type=float),
+        'min_floor': source.get('min_floor', type=int),
+        'max_floor_count': source.get('max_floor_count', type=int),
+        'balcony': source.get('balcony'),
+        'elevator': source.get('elevator'),
+        'parking': source.get('parking'),
+        'district': source.get('district')
     }
 
+SIMILARITY_FIELDS = ['cosine_sim', 'jaccard_sim', 'dice_sim']
+
+def rank_apartments(model, search_query, filters, similarity_sort=None, top_n=20):
+    """(rowid, miary podobieństwa) dla top_n wyników w kolejności wyświetlania, bez pobierania wierszy"""
+    # filtry zawężają zbiór dokumentów jeszcze przed liczeniem tf-idf
+    with metrics.stage('filter_ids'):
+        candidates = model.candidates(filter_engine().get_filtered_row_ids(**filters))
+    # lematyzacja, sklejanie fraz i wektor tf-idf zapytania - raz na request
+    with metrics.stage('query_compile'):
+        query = model.compile_query(search_query)
+    with metrics.stage('scoring'):
+        top_indices = model.index.search(query, top_n=top_n, candidates=candidates)
+    if not top_indices:
+        return []
+
+    # miary podobieństwa dla wszystkich wyników naraz
+    with metrics.stage('similarity'):
+        sims = model.similarity.scores(query, top_indices)
+    ranked = []
+    for idx, doc in enumerate(top_indices):
+        ranked.append((int(model.row_ids[doc]), {
+            'cosine_sim': float(sims['cosine'][idx]),
+            'jaccard_sim': float(sims['jaccard'][idx]),
+            'dice_sim': float(sims['dice'][idx])
+        }))
+
+    # Sortowanie po miarach podobieństwa
+    if similarity_sort in ('cosine', 'jaccard', 'dice'):
+        ranked.sort(key=lambda item: item[1][f'{similarity_sort}_sim'], reverse=True)
+    return ranked
+
+def search_apartments(model, search_query, filters, similarity_sort=None, top_n=20):
+    """wyniki wyszukiwania tekstowego z miarami podobieństwa"""
+    ranked = rank_apartments(model, search_query, filters, similarity_sort, top_n)
+    with metrics.stage('sql_rows'):
+        rows = list(utils.iter_rows([row_id for row_id, _ in ranked]))
+    sims = dict(ranked)
+    return [{**row, **sims[row['row_id']]} for row in rows]
+
+def run_search(search_query, filters, sort_by, similarity_sort, after):
+    """wyniki strony i kursor następnej strony (tylko dla samych filtrów); after - klucz z parse_after"""
+    if search_query:
+        return search_apartments(get_tfidf_model(), search_query, filters, similarity_sort), None
+    # stronicowanie keyset - kursor ostatniego wiersza poprzedniej strony
+    with metrics.stage('filters'):
+        results = filter_engine().get_filtered_apartments(**filters, sort_by=sort_by, after=after)
+    return results, encode_cursor(next_page_cursor(results, sort_by))
+
+def city_description():
+    # z pliku cache, artykuł pobiera i odświeża wątek w tle - nigdy ten request
+    from wikipedia_parser import get_city_description
+    return get_city_description()
+
+def city_description_fallback():
+    from wikipedia_parser import fallback_city_description
+    return fallback_city_description()
+
+@app.before_request
+def start_profile():
+    if app.config['PROFILE_REQUESTS'] and profiling.requested(request.headers, request.args):
+        profiling.start({
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'query': request.values.get('search', '').strip(),
+            'filters': {name: value for name, value in parse_filters(request.values).items() if value is not None},
+            'params': request.values.to_dict(),
+        })
+
+# after_request działa w odwrotnej kolejności - zapis profilu już z nagłówkiem Server-Timing
+@app.after_request
+def save_profile(response):
+    request_profile = profiling.stop()
+    if request_profile is None:
+        return response
+    response.headers['X-Profile-File'] = request_profile.name + '.prof'
+    save = functools.partial(profiling.save, request_profile, app.config['PROFILE_DIR'],
+                             app.config['PROFILE_KEEP'], status=response.status_code,
+                             server_timing=response.headers.get('Server-Timing'))
+    if response.is_streamed:
+        # treść NDJSON powstaje dopiero przy wysyłaniu - profil zapisywany po jej zamknięciu
+        response.response = profiling.profile_iterable(request_profile, response.response)
+        response.call_on_close(save)
+    else:
+        save()
+    return response
+
+@app.teardown_request
+def drop_profile(exc):
+    # save_profile nie doszedł do zapisu (błąd w innym hooku) - profil bez pliku, ale zwolniony dla kolejnych requestów
+    request_profile = profiling.stop()
+    if request_profile is not None:
+        request_profile.finish()
+
+@app.before_request
+def start_timing():
+    # scrapowanie /metrics nie trafia do własnych histogramów
+    if request.endpoint != 'metrics_api':
+        metrics.start_request()
+
+@app.after_request
+def add_server_timing(response):
+    header = metrics.finish_request(request.endpoint)
+    if header:
+        response.headers['Server-Timing'] = header
+    return response
+
+@app.route('/', methods=['GET', 'POST'])
+@profiling.profiled
+async def index():
+    """strona z formularzem; etapy niezależne od siebie liczone równolegle w puli wątków
+
+    Panele (statystyki, dzielnice, opis miasta, wykresy) mają limity czasu z
+    STAGE_TIMEOUTS - spóźniony panel jest pomijany zamiast wstrzymywać stronę.
+    """
+    filters = parse_filters(request.form)
+
     sort_by = request.form.get('sort_by')
     search_query = request.form.get('search', '').strip()
-    
+    similarity_sort = request.form.get('similarity_sort')
+    try:
+        after = parse_after(request.form.get('after'), False)
+    except ValueError:
+        # uszkodzony kursor w formularzu - jawnie od pierwszej strony
+        after = None
+
+    timeouts = app.config['STAGE_TIMEOUTS']
+    degraded = []
+    # panele nie zależą od wyników - startują od razu, równolegle z wyszukiwaniem
+    panels = asyncio.gather(
+        run_panel('district_stats', analyze_districts,
+                  timeout=timeouts['district_stats'], degraded=degraded),
+        run_panel('district_breakdown', get_district_stats,
+                  timeout=timeouts['district_breakdown'], fallback=[], degraded=degraded),
+        run_panel('city_stats', city_description,
+                  timeout=timeouts['city_stats'], fallback=city_description_fallback(), degraded=degraded),
+        run_panel('all_districts', get_all_districts,
+                  timeout=timeouts['all_districts'], fallback=[], degraded=degraded),
+    )
+
     results = []
-    map_html = None
+    next_cursor = None
+    map_geojson = None
     charts = {}
-    
-    if request.method == 'POST':
-        if search_query:
-            top_indices = search_tfidf(search_query, documents, tfidf_docs, top_n=20)
-            
-            if top_indices:
-                filtered_ids = [doc_ids[i] for i in top_indices]
-                placeholders = ','.join(['?'] * len(filtered_ids))
-                
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute(f'SELECT * FROM apartments WHERE id IN ({placeholders})', filtered_ids)
-                rows = cursor.fetchall()
-                conn.close()
-                
-                id_to_row = {row['id']: dict(row) for row in rows}
-                results = []
-                
-                # obliczenie miary dla każdego wyniku
-                for idx, _id in enumerate(filtered_ids):
-                    if _id in id_to_row:
-                        result = id_to_row[_id]
-                        orig_idx = top_indices[idx]
-                        doc_tokens_set = set(tokenized_docs[orig_idx])
-                        sims = calculate_similarity_for_doc(search_query, tfidf_docs[orig_idx], 
-                                                           doc_tokens_set, df_counts, N)
-                        result['cosine_sim'] = sims['cosine']
-                        result['jaccard_sim'] = sims['jaccard']
-                        result['dice_sim'] = sims['dice']
-                        results.append(result)
-                
-                # Sortowanie po miarach podobieństwa
-                similarity_sort = request.form.get('similarity_sort')
-                if similarity_sort == 'cosine':
-                    results.sort(key=lambda x: x.get('cosine_sim', 0), reverse=True)
-                elif similarity_sort == 'jaccard':
-                    results.sort(key=lambda x: x.get('jaccard_sim', 0), reverse=True)
-                elif similarity_sort == 'dice':
-                    results.sort(key=lambda x: x.get('dice_sim', 0), reverse=True)
-            else:
-                results = []
-        else:
-            results = get_filtered_apartments(**filters, sort_by=sort_by)
-        
-        if results:
-            map_html = create_map(results)
-            charts = create_charts(results)
-    
-    district_stats = analyze_districts()
-    
-    from wikipedia_parser import get_city_description
-    city_stats = get_city_description()
-    
-    similarity_sort = request.form.get('similarity_sort')
-    
+
+    try:
+        # model TF-IDF ładowany raz na wersję bazy - już przy pierwszym wejściu na stronę
+        with metrics.stage('model'):
+            await run_stage(get_tfidf_model)
+        if request.method == 'POST':
+            with metrics.stage('search'):
+                results, next_cursor = await run_stage(run_search, search_query, filters, sort_by, similarity_sort, after)
+            if results:
+                # mapa z tych samych wierszy co lista - bez drugiego wyszukiwania w /api/map
+                charts, map_geojson = await asyncio.gather(
+                    run_panel('charts', create_charts, results,
+                              timeout=timeouts['charts'], fallback={}, degraded=degraded),
+                    run_panel('map', map_data.all_zooms_geojson, results,
+                              timeout=timeouts['map'], degraded=degraded),
+                )
+    finally:
+        # także przy błędzie wyszukiwania - żeby etapy paneli nie zostały bez odbiorcy
+        district_stats, district_breakdown, city_stats, all_districts = await panels
+
+    with metrics.stage('render'):
+        return render_template('index.html',
+                           results=results,
+                           next_cursor=next_cursor,
+                           filters=filters,
+                           sort_by=sort_by,
+                           similarity_sort=similarity_sort,
+                           map_geojson=map_geojson,
+                           charts=charts,
+                           city_stats=city_stats,
+                           district_stats=district_stats,
+                           district_breakdown=district_breakdown,
+                           search_query=search_query,
+                           enumerate=enumerate,
+                           all_districts=all_districts,
+                           degraded=degraded)
+
+
+@app.route('/api/map')
+@profiling.profiled
+def map_api():
+    """wyniki jako GeoJSON; zoom=N - klastry dla zoomu N, zoom=all - punkty i klastry dla wszystkich zoomów"""
+    filters = parse_filters(request.args)
+    search_query = request.args.get('search', '').strip()
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, map_data.MAP_MAX_RESULTS))
+
+    if search_query:
+        results = search_apartments(get_tfidf_model(), search_query, filters,
+                                    request.args.get('similarity_sort'), top_n=limit or 20)
+    else:
+        try:
+            after = parse_after(request.args.get('after'), False)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        results = filter_engine().get_filtered_apartments(
+            **filters, sort_by=request.args.get('sort_by'), after=after, limit=limit or 50)
+
+    zoom = request.args.get('zoom')
+    if zoom == 'all':
+        return jsonify(map_data.all_zooms_geojson(results))
+    if zoom is not None:
+        return jsonify(map_data.cluster_geojson(results, request.args.get('zoom', type=int)))
+    return jsonify(map_data.to_geojson(results))
+
+
+# limity /api/search - wiersze na odpowiedź i pula rankingu wyszukiwania tekstowego
+API_DEFAULT_LIMIT = 50
+API_MAX_RESULTS = 10000
+# tyle wierszy NDJSON trafia do jednego zapisu odpowiedzi
+NDJSON_BATCH = 100
+
+def parse_fields(text, search):
+    """lista pól z parametru fields (po przecinku) albo None - wszystkie kolumny"""
+    if not text:
+        return None
+    fields = list(dict.fromkeys(name.strip() for name in text.split(',') if name.strip()))
+    allowed = ['row_id'] + utils.get_apartment_columns(utils.get_db_version())
+    if search:
+        allowed += SIMILARITY_FIELDS
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ValueError(f"nieznane pola: {', '.join(unknown)}")
+    return fields
+
+def parse_after(text, search):
+    """kursor z parametru after: pozycja w rankingu (wyszukiwanie tekstowe) albo klucz (wartość, row_id)"""
+    if not text:
+        return 0 if search else None
+    if search:
+        try:
+            offset = int(text)
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise ValueError(f"nieprawidłowy kursor after dla wyszukiwania tekstowego: {text}")
+        return offset
+    cursor = decode_cursor(text)
+    if cursor is None:
+        raise ValueError(f"nieprawidłowy kursor after: {text}")
+    return cursor
+
+def clamp_limit(value, default):
+    return max(1, min(value if value is not None else default, API_MAX_RESULTS))
+
+def ndjson_lines(rows, fields):
+    """wiersze JSON (z polem cursor do wznowienia) sklejane w paczki po NDJSON_BATCH"""
+    batch = []
+    for row, cursor in rows:
+        item = {name: row.get(name) for name in fields} if fields is not None else row
+        item['cursor'] = cursor
+        batch.append(json.dumps(item, ensure_ascii=False))
+        if len(batch) == NDJSON_BATCH:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+@app.route('/api/search')
+@profiling.profiled
+def search_api():
+    """wyniki jako NDJSON - jeden obiekt JSON na mieszkanie, strumieniowane partiami z bazy
+
+    Parametry jak w formularzu (search, 13 filtrów, sort_by, similarity_sort) oraz
+    fields (kolumny po przecinku), limit i after - kursor z pola "cursor"
+    ostatniego odebranego wiersza (nieprawidłowy kursor - 400). Mniej niż limit
+    wierszy oznacza koniec wyników. Wyszukiwanie tekstowe liczy ranking top_n wyników (domyślnie 20) i stronicuje
+    po pozycji w nim.
+    """
+    filters = parse_filters(request.args)
+    search_query = request.args.get('search', '').strip()
     try:
-        all_districts = get_all_districts()
-    except Exception as e:
-        all_districts = []
-    
-    return render_template('index.html',
-                       results=results,
-                       filters=filters,
-                       sort_by=sort_by,
-                       similarity_sort=similarity_sort,
-                       map_html=map_html,
-                       charts=charts,
-                       city_stats=city_stats,
-                       district_stats=district_stats,
-                       search_query=search_query,
-                       enumerate=enumerate,
-                       all_districts=all_districts)
+        fields = parse_fields(request.args.get('fields'), bool(search_query))
+        # kursor z innego trybu albo uszkodzony - błąd zamiast cichego startu od początku
+        after = parse_after(request.args.get('after'), bool(search_query))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if search_query:
+        top_n = clamp_limit(request.args.get('top_n', type=int), 20)
+        limit = clamp_limit(request.args.get('limit', type=int), top_n)
+        # ranking przed wysłaniem odpowiedzi, strumieniowane jest tylko pobieranie wierszy
+        ranked = rank_apartments(get_tfidf_model(), search_query, filters,
+                                 request.args.get('similarity_sort'), top_n)[after:after + limit]
+        sims = dict(ranked)
+        positions = {row_id: after + n + 1 for n, (row_id, _) in enumerate(ranked)}
+
+        def rows():
+            for row in utils.iter_rows(list(sims), fields):
+                yield {**row, **sims[row['row_id']]}, str(positions[row['row_id']])
+    else:
+        sort_by = request.args.get('sort_by')
+        sort_key = sort_by if sort_by in utils.VALID_SORT else None
+        limit = clamp_limit(request.args.get('limit', type=int), API_DEFAULT_LIMIT)
+
+        def rows():
+            for row in filter_engine().iter_filtered_apartments(filters, sort_by, after, limit, fields):
+                cursor = (row[sort_key] if sort_key else None, row['row_id'])
+                yield row, encode_cursor(cursor)
+
+    return Response(stream_with_context(ndjson_lines(rows(), fields)), mimetype='application/x-ndjson')
+
+
+@app.route('/metrics')
+def metrics_api():
+    """histogramy czasów, trafienia w cache i liczba ocenianych dokumentów w formacie Prometheusa"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,11 @@
+"""Aplikacja dla serwera ASGI, np.:
+    uvicorn asgi:application --workers 4
+
+Widok strony głównej jest async (wymaga asgiref, Flask[async]); etapy strony
+i tak są wykonywane w puli wątków z stages.py.
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+application = WsgiToAsgi(app)
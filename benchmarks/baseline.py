@@ -0,0 +1,63 @@
+"""Pierwotne wyszukiwanie i miary podobieństwa na słownikach tf-idf - punkt odniesienia dla benchmarków.
+
+Aplikacja ich nie używa: ranking liczy search_index (indeks odwrotny albo
+plik indeksu), a miary SimilarityEngine na macierzy CSR. Benchmarki mierzą
+względem nich przyspieszenie i sprawdzają, że wyniki się nie zmieniły.
+"""
+import math
+
+from utils import compile_query
+
+
+def search_tfidf(query, documents, tfidf_docs, top_n=25):
+    """skan liniowy po wszystkich dokumentach"""
+    if isinstance(query, str):
+        query = compile_query(query)
+    scores = []
+
+    for idx, doc_tfidf in enumerate(tfidf_docs):
+        score = sum(doc_tfidf.get(token, 0) for token in query.tokens)
+        if score > 0:
+            scores.append((idx, score))
+
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return [i for i, _ in scores[:top_n]]
+
+
+def cosine_similarity(vec1, vec2):
+    all_tokens = set(vec1.keys()) | set(vec2.keys())
+    dot_product = sum(vec1.get(t, 0) * vec2.get(t, 0) for t in all_tokens)
+    mag1 = math.sqrt(sum(v**2 for v in vec1.values()))
+    mag2 = math.sqrt(sum(v**2 for v in vec2.values()))
+    if mag1 == 0 or mag2 == 0:
+        return 0
+    return dot_product / (mag1 * mag2)
+
+
+def jaccard_similarity(vec1, vec2):
+    all_tokens = set(vec1.keys()) | set(vec2.keys())
+
+    numerator = sum(vec1.get(t, 0) * vec2.get(t, 0) for t in all_tokens)
+    sum_sq1 = sum(v**2 for v in vec1.values())
+    sum_sq2 = sum(v**2 for v in vec2.values())
+
+    denominator = sum_sq1 + sum_sq2 - numerator
+    return numerator / denominator if denominator > 0 else 0
+
+
+def dice_similarity(vec1, vec2):
+    all_tokens = set(vec1.keys()) | set(vec2.keys())
+
+    numerator = 2 * sum(vec1.get(t, 0) * vec2.get(t, 0) for t in all_tokens)
+    sum_sq1 = sum(v**2 for v in vec1.values())
+    sum_sq2 = sum(v**2 for v in vec2.values())
+
+    denominator = sum_sq1 * sum_sq2
+    return numerator / denominator if denominator > 0 else 0
+
+
+SIMILARITIES = {
+    'cosine': cosine_similarity,
+    'jaccard': jaccard_similarity,
+    'dice': dice_similarity,
+}
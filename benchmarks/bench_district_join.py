@@ -0,0 +1,54 @@
+"""Spatial join dzielnic: pętla contains/distance po punktach vs zapytania do STRtree.
+
+Sprawdza, że obie wersje przypisują te same dzielnice, i mierzy czas.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.bench_district_join [--db apartments_sale.db] [--shapefile location/GraniceOsiedli.shp]
+"""
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+
+import utils
+from district_join import SHAPEFILE_PATH, load_districts, match_districts, match_districts_loop
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=utils.DB_PATH)
+    parser.add_argument('--shapefile', default=SHAPEFILE_PATH)
+    parser.add_argument('--limit', type=int, help='tylko pierwsze N mieszkań (pętla jest wolna)')
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT latitude, longitude FROM apartments
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    """)
+    rows = cursor.fetchall()[:args.limit]
+    connection.close()
+    latitudes = np.array([row[0] for row in rows])
+    longitudes = np.array([row[1] for row in rows])
+
+    districts = load_districts(args.shapefile)
+    print(f"mieszkań: {len(rows)}, wielokątów: {len(districts)}\n")
+
+    start = time.perf_counter()
+    expected, expected_exact = match_districts_loop(districts, latitudes, longitudes)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got, got_exact = match_districts(districts, latitudes, longitudes)
+    tree = time.perf_counter() - start
+
+    assert np.array_equal(got, expected) and np.array_equal(got_exact, expected_exact)
+    print(f"dokładnie w dzielnicy: {int(got_exact.sum())}, najbliższa dzielnica: {int((~got_exact).sum())}")
+    print(f"pętla:   {loop * 1000:>10.1f} ms")
+    print(f"STRtree: {tree * 1000:>10.1f} ms  ({loop / tree:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
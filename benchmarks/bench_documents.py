@@ -0,0 +1,53 @@
+"""Dokumenty mieszkań: apply(make_document) wiersz po wierszu vs build_documents kolumnami.
+
+Sprawdza, że oba sposoby dają identyczne dokumenty (i takie jak w bazie),
+i mierzy czas.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.bench_documents [--db apartments_sale.db] [--repeat 3]
+"""
+import argparse
+import sqlite3
+import statistics
+import time
+
+import pandas as pd
+
+import utils
+from documents import build_documents, make_document
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=utils.DB_PATH)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    frame = pd.read_sql_query('SELECT * FROM apartments ORDER BY rowid', connection)
+    connection.close()
+    stored = frame.pop('document').tolist()
+    print(f"mieszkań: {len(frame)}\n")
+
+    expected = frame.apply(make_document, axis=1).tolist()
+    got = build_documents(frame)
+    assert got == expected
+    assert got == stored
+
+    rows = measure(lambda: frame.apply(make_document, axis=1), args.repeat)
+    cols = measure(lambda: build_documents(frame), args.repeat)
+    print(f"apply(make_document): {rows:>9.1f} ms")
+    print(f"build_documents:      {cols:>9.1f} ms  ({rows / cols:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Filtry: zapytanie SQL do SQLite vs kopia kolumnowa w pamięci (columnar.py).
+
+Dla każdej kombinacji filtrów zapisuje też EXPLAIN QUERY PLAN, żeby regresje
+planów (np. SCAN zamiast SEARCH po indeksie) były widoczne w diffie wyników.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.bench_filters [--db apartments_sale.db] [--repeat 30] [--out plany.json]
+"""
+import argparse
+import json
+import statistics
+import time
+
+import columnar
+import utils
+
+# kombinacje filtrów i sortowania, które faktycznie wysyła formularz
+FILTER_CASES = [
+    ('bez filtrów', {}, None),
+    ('sortowanie po cenie', {}, 'price'),
+    ('cena do 600k', {'max_price': 600000.0}, None),
+    ('cena do 600k, sort cena', {'max_price': 600000.0}, 'price'),
+    ('pokoje 3+, metraż 50-80', {'min_rooms': 3, 'min_square': 50.0, 'max_square': 80.0}, 'squareMeters'),
+    ('rok 2010+, balkon, winda', {'min_build_year': 2010, 'balcony': 'yes', 'elevator': 'yes'}, None),
+    ('centrum do 2 km, sort pokoje', {'max_centre_distance': 2.0}, 'rooms'),
+    ('piętro 2+, max 5 pięter', {'min_floor': 2, 'max_floor_count': 5}, 'floor'),
+    ('dzielnica + cena', {'district': 'Stare Miasto', 'max_price': 900000.0}, 'price'),
+    ('parking, sort liczba pięter', {'parking': 'yes'}, 'floorCount'),
+]
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def query_plan(filters, sort_by, after=None):
+    query, params = utils.build_filter_query(filters, sort_by, after)
+    cursor = utils.get_read_connection().cursor()
+    cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+    return [row['detail'] for row in cursor.fetchall()]
+
+
+def all_pages(get_page, filters, sort_by, limit):
+    """przejście po wszystkich stronach kursorem - kontrola, że nic nie ginie ani się nie powtarza"""
+    rows, after = [], None
+    while True:
+        page = get_page(**filters, sort_by=sort_by, after=after, limit=limit)
+        rows.extend(page)
+        after = utils.next_page_cursor(page, sort_by, limit)
+        if after is None:
+            return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=utils.DB_PATH)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--out', help='plik JSON z planami i czasami')
+    args = parser.parse_args()
+
+    utils.DB_PATH = args.db
+    start = time.perf_counter()
+    columns = columnar.get_columns()
+    print(f"wczytanie kolumn: {(time.perf_counter() - start) * 1000:.1f} ms, wierszy: {len(columns.row_ids)}\n")
+    print(f"{'filtry':<32} {'wyników':>8} {'sql ms':>8} {'kolumny ms':>11} {'x':>6}")
+
+    report = []
+    for label, filters, sort_by in FILTER_CASES:
+        expected = utils.get_filtered_apartments(**filters, sort_by=sort_by)
+        got = columnar.get_filtered_apartments(**filters, sort_by=sort_by)
+        assert got == expected, label
+
+        # strona w środku wyników - kursor z pierwszej strony
+        after = utils.next_page_cursor(expected, sort_by)
+        if after is not None:
+            assert columnar.get_filtered_apartments(**filters, sort_by=sort_by, after=after) == \
+                utils.get_filtered_apartments(**filters, sort_by=sort_by, after=after), label
+
+        sql = measure(lambda: utils.get_filtered_apartments(**filters, sort_by=sort_by), args.repeat)
+        cols = measure(lambda: columnar.get_filtered_apartments(**filters, sort_by=sort_by), args.repeat)
+        next_page = measure(lambda: utils.get_filtered_apartments(**filters, sort_by=sort_by, after=after),
+                            args.repeat) if after is not None else None
+        plan = query_plan(filters, sort_by)
+        print(f"{label:<32} {len(expected):>8} {sql:>8.2f} {cols:>11.2f} {sql / cols:>5.1f}x")
+        for step in plan:
+            print(f"    {step}")
+
+        report.append({
+            'case': label, 'filters': filters, 'sort_by': sort_by,
+            'sql_ms': sql, 'columnar_ms': cols, 'next_page_sql_ms': next_page,
+            'plan': plan, 'next_page_plan': query_plan(filters, sort_by, after) if after else None,
+        })
+
+    # pełne przejście kursorem dla jednego przypadku - te same wiersze co bez limitu
+    filters, sort_by = {'max_price': 600000.0}, 'price'
+    paged = all_pages(utils.get_filtered_apartments, filters, sort_by, limit=50)
+    assert paged == utils.get_filtered_apartments(**filters, sort_by=sort_by, limit=10 ** 9)
+    assert all_pages(columnar.get_filtered_apartments, filters, sort_by, limit=50) == paged
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Model wyszukiwania: budowa w pamięci z dokumentów vs plik indeksu z data_prep (mmap).
+
+Sprawdza, że oba modele dają te same top-k i te same miary podobieństwa
+(także z filtrami), i mierzy start modelu, pamięć zaalokowaną przez proces
+(tracemalloc - strony z mmap pliku są współdzielone i nie są tu liczone)
+oraz czas zapytania.
+
+Uruchomienie z katalogu głównego repo (najpierw python data_prep.py):
+    python -m benchmarks.bench_index_file [--db apartments_sale.db] [--repeat 20]
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+
+import utils
+from benchmarks.bench_search import BROAD_QUERIES, NARROW_QUERIES
+from search_index import TfidfModel, load_mapped_model
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def build(fn):
+    """(model, czas ms, MB zaalokowane przez proces) - pamięć z osobnej budowy, bo tracemalloc spowalnia"""
+    start = time.perf_counter()
+    model = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    traced = fn()
+    allocated = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+    tracemalloc.stop()
+    del traced
+    return model, elapsed, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=utils.DB_PATH)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--top-n', type=int, default=20)
+    args = parser.parse_args()
+
+    utils.DB_PATH = args.db
+    version = utils.get_db_version()
+    mapped, mapped_ms, mapped_mb = build(lambda: load_mapped_model(version))
+    if mapped is None:
+        raise SystemExit(f"brak aktualnego pliku indeksu dla {args.db} - uruchom python data_prep.py")
+    python, python_ms, python_mb = build(
+        lambda: TfidfModel(*utils.load_documents_cached.__wrapped__(version), version))
+
+    print(f"dokumentów: {mapped.N}, tokenów w słowniku: {len(mapped.vocabulary)}\n")
+    print(f"{'model':<22} {'start ms':>10} {'pamięć MB':>10}")
+    print(f"{'w pamięci (Python)':<22} {python_ms:>10.1f} {python_mb:>10.1f}")
+    print(f"{'plik indeksu (mmap)':<22} {mapped_ms:>10.1f} {mapped_mb:>10.1f}\n")
+
+    assert list(mapped.row_ids) == python.row_ids
+    assert mapped.vocabulary == python.vocabulary
+
+    rng = random.Random(1)
+    queries = BROAD_QUERIES + NARROW_QUERIES
+    queries += [' '.join(rng.sample(python.vocabulary, rng.randint(1, 5))) for _ in range(300)]
+    for text in queries:
+        subset = rng.sample(python.row_ids, len(python.row_ids) // rng.choice([2, 20, 200]))
+        for row_ids in (None, subset):
+            q_python, q_mapped = python.compile_query(text), mapped.compile_query(text)
+            expected = python.index.search(q_python, args.top_n, python.candidates(row_ids))
+            got = mapped.index.search(q_mapped, args.top_n, mapped.candidates(row_ids))
+            assert got == expected, text
+            if expected:
+                for name, values in python.similarity.scores(q_python, expected).items():
+                    assert np.array_equal(mapped.similarity.scores(q_mapped, got)[name], values), (text, name)
+    print(f"zgodne wyniki dla {len(queries)} zapytań (bez filtrów i z filtrami)\n")
+
+    print(f"{'zapytanie':<40} {'Python ms':>10} {'mmap ms':>9}")
+    for text in BROAD_QUERIES + NARROW_QUERIES:
+        q_python, q_mapped = python.compile_query(text), mapped.compile_query(text)
+        py = measure(lambda: python.index.search(q_python, args.top_n), args.repeat)
+        mm = measure(lambda: mapped.index.search(q_mapped, args.top_n), args.repeat)
+        print(f"{text:<40} {py:>10.2f} {mm:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Lematyzacja: słownik słowo po słowie vs drzewo fraz (PhraseLemmatizer).
+
+Korpus to teksty dokumentów przed lematyzacją (etykiety kategorii i
+dzielnice) oraz zapytania z bench_search. Mierzy przepustowość w tokenach
+na sekundę i pokazuje, ile pozycji w postingach zabierają popularne słowa
+przed i po łączeniu fraz.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.bench_lemmatizer [--db apartments_sale.db] [--repeat 5]
+"""
+import argparse
+import sqlite3
+import statistics
+import time
+from collections import Counter
+
+import pandas as pd
+
+import utils
+from benchmarks.bench_search import BROAD_QUERIES, NARROW_QUERIES
+from documents import document_text
+from lemmatization import lemmatize_text, lemmatize_words
+
+COMMON_WORDS = ['stare', 'wielki', 'centrum', 'piętro', 'niski', 'budynek', 'blok', 'od', 'do', 'z']
+
+
+def measure(fn, texts, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def document_frequency(documents):
+    df = Counter()
+    for doc in documents:
+        df.update(set(doc.split()))
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=utils.DB_PATH)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.db)
+    frame = pd.read_sql_query('SELECT * FROM apartments ORDER BY rowid', connection)
+    connection.close()
+    texts = frame.apply(document_text, axis=1).tolist() + BROAD_QUERIES + NARROW_QUERIES
+    tokens = sum(len(text.split()) for text in texts)
+    print(f"tekstów: {len(texts)}, tokenów: {tokens}\n")
+
+    words = [lemmatize_words(text) for text in texts]
+    phrases = [lemmatize_text(text) for text in texts]
+    # wynik drzewa fraz jest lematem samego siebie - dokumenty i zapytania przechodzą ten sam proces
+    assert [lemmatize_text(text) for text in phrases] == phrases
+
+    word_time = measure(lemmatize_words, texts, args.repeat)
+    phrase_time = measure(lemmatize_text, texts, args.repeat)
+    print(f"słowo po słowie: {tokens / word_time:>12,.0f} tokenów/s")
+    print(f"drzewo fraz:     {tokens / phrase_time:>12,.0f} tokenów/s  ({word_time / phrase_time:.2f}x)\n")
+
+    word_df = document_frequency(words)
+    phrase_df = document_frequency(phrases)
+    print(f"pozycji w postingach: {sum(word_df.values())} -> {sum(phrase_df.values())}, "
+          f"tokenów w słowniku: {len(word_df)} -> {len(phrase_df)}")
+    for word in COMMON_WORDS:
+        lemma = lemmatize_words(word)
+        print(f"  {lemma:<10} df {word_df[lemma]:>8} -> {phrase_df[lemma]:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Porównanie wyszukiwania tekstowego: skan liniowy vs indeks odwrotny vs top-k.
+
+Top-k osobno metodą MaxScore i wszystkimi wynikami naraz (numpy) oraz z
+automatycznym wyborem (InvertedIndex.top_k) - z medianą dla zapytań
+szerokich i wąskich.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.bench_search [--db apartments_sale.db] [--repeat 50]
+"""
+import argparse
+import math
+import statistics
+import time
+
+import utils
+from benchmarks import baseline
+from search_index import TfidfModel
+
+BROAD_QUERIES = [
+    'mieszkanie wrocław balkon winda',
+    'balkon winda parking piwnica',
+    'blok nowe tanie balkon',
+    'mieszkanie z balkonem niskie piętro',
+]
+
+NARROW_QUERIES = [
+    'kamienica przedwojenne',
+    'wieżowiec luksusowe ochrona',
+    'bardzo blisko apteka kawalerka',
+    'ścisłe centrum do remontu',
+]
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def exhaustive(index, query, top_n):
+    scores = index.score(query.tokens)
+    ranked = sorted(((idx, score) for idx, score in scores.items() if score > 0),
+                    key=lambda x: (-x[1], x[0]))
+    return [i for i, _ in ranked[:top_n]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=utils.DB_PATH)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--top-n', type=int, default=20)
+    args = parser.parse_args()
+
+    utils.DB_PATH = args.db
+    # model budowany w pamięci, nie z pliku indeksu; słowniki tf-idf dla skanu liniowego osobno
+    version = utils.get_db_version()
+    row_ids, doc_ids, documents = utils.load_documents_cached(version)
+    model = TfidfModel(row_ids, doc_ids, documents, version)
+    tfidf_docs = utils.compute_tfidf(documents)[0]
+    print(f"dokumentów: {model.N}, tokenów w słowniku: {len(model.vocabulary)}\n")
+    print(f"{'zapytanie':<40} {'pokrycie':>8} {'skan ms':>9} {'indeks ms':>10} {'MaxScore':>9} "
+          f"{'numpy ms':>9} {'top-k ms':>9} {'x skan':>7}")
+
+    for label, queries in (('szerokie', BROAD_QUERIES), ('wąskie', NARROW_QUERIES)):
+        print(f"-- {label}")
+        group = []
+        for text in queries:
+            query = model.compile_query(text)
+            expected = baseline.search_tfidf(text, documents, tfidf_docs, top_n=args.top_n)
+            assert model.index.search(query, top_n=args.top_n) == expected, text
+            assert model.index.maxscore_top_k(query.tokens, args.top_n) == expected, text
+            assert model.index.exhaustive_top_k(query.tokens, args.top_n) == expected, text
+            assert exhaustive(model.index, query, args.top_n) == expected, text
+            # miary z macierzy CSR jak ze słowników (do błędów zaokrągleń)
+            for measure_name, values in model.similarity.scores(query, expected).items():
+                reference = [baseline.SIMILARITIES[measure_name](query.tfidf, tfidf_docs[idx]) for idx in expected]
+                assert all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12) for a, b in zip(values, reference)), text
+
+            # suma długości postingów zapytania / N - top_k wybiera po niej metodę (BROAD_COVERAGE)
+            coverage = sum(len(model.index.postings[t][0]) for t in query.tokens if t in model.index.postings) / model.N
+            times = (
+                measure(lambda: baseline.search_tfidf(query, documents, tfidf_docs, top_n=args.top_n), args.repeat),
+                measure(lambda: exhaustive(model.index, query, args.top_n), args.repeat),
+                measure(lambda: model.index.maxscore_top_k(query.tokens, args.top_n), args.repeat),
+                measure(lambda: model.index.exhaustive_top_k(query.tokens, args.top_n), args.repeat),
+                measure(lambda: model.index.search(query, top_n=args.top_n), args.repeat),
+            )
+            group.append(times)
+            print(f"{text:<40} {coverage:>8.2f} {times[0]:>9.2f} {times[1]:>10.2f} {times[2]:>9.2f} "
+                  f"{times[3]:>9.2f} {times[4]:>9.2f} {times[0] / times[4]:>6.1f}x")
+        medians = [statistics.median(column) for column in zip(*group)]
+        print(f"{'mediana: ' + label:<40} {'':>8} {medians[0]:>9.2f} {medians[1]:>10.2f} {medians[2]:>9.2f} "
+              f"{medians[3]:>9.2f} {medians[4]:>9.2f} {medians[0] / medians[4]:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
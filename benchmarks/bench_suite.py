@@ -0,0 +1,248 @@
+"""Benchmark komponentów na syntetycznych bazach w kilku skalach (benchmarks/synthetic.py).
+
+Dla każdej skali i komponentu: przepustowość oraz percentyle czasu jednego
+wywołania (p50/p95/p99). Wyniki z metadanymi (commit, wersje) trafiają do
+pliku JSON, a --compare porównuje je z plikiem z innego commitu.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.bench_suite --scales 10000,100000 --out wyniki.json
+    python -m benchmarks.bench_suite --scales 10000,100000 --compare wyniki.json
+    python -m benchmarks.bench_suite --scales 1000000 --components index_search,filters,map
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import map_data
+import utils
+from benchmarks import baseline
+from benchmarks.bench_filters import FILTER_CASES
+from benchmarks.bench_search import BROAD_QUERIES, NARROW_QUERIES
+from benchmarks.synthetic import build_database, synthetic_districts
+from district_join import match_districts
+from documents import build_documents
+from search_index import get_tfidf_model
+
+QUERIES = BROAD_QUERIES + NARROW_QUERIES
+# wierszy na wywołanie build_documents (jak partia w data_prep)
+DOCUMENT_BATCH = 10000
+
+
+def timed(fn, calls):
+    """czasy (ms) kolejnych wywołań fn(arg) dla arg z calls"""
+    times = []
+    for arg in calls:
+        start = time.perf_counter()
+        fn(arg)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+class Context:
+    """dane jednej skali liczone leniwie i współdzielone przez komponenty"""
+
+    def __init__(self, seed):
+        self.seed = seed
+        self._tfidf = None
+        self._documents = None
+
+    @property
+    def documents(self):
+        if self._documents is None:
+            self._documents = utils.load_documents_cached.__wrapped__()[2]
+        return self._documents
+
+    @property
+    def tfidf_docs(self):
+        if self._tfidf is None:
+            self._tfidf = utils.compute_tfidf(self.documents)[0]
+        return self._tfidf
+
+
+# ========== KOMPONENTY ==========
+# każdy zwraca (jednostka przepustowości, czasy wywołań w ms, jednostek pracy na wywołanie)
+
+def bench_compute_tfidf(ctx, repeat):
+    documents = ctx.documents
+    return 'dokumentów/s', timed(lambda _: utils.compute_tfidf(documents), range(repeat)), len(documents)
+
+
+def bench_search_tfidf(ctx, repeat):
+    """skan liniowy po wszystkich dokumentach (baseline.search_tfidf)"""
+    documents, tfidf_docs = ctx.documents, ctx.tfidf_docs
+    queries = [utils.compile_query(text) for text in QUERIES] * repeat
+    return 'zapytań/s', timed(lambda query: baseline.search_tfidf(query, documents, tfidf_docs), queries), 1
+
+
+def bench_index_search(ctx, repeat):
+    """indeks odwrotny z top-k (model z pliku indeksu albo zbudowany w pamięci)"""
+    model = get_tfidf_model()
+    queries = [model.compile_query(text) for text in QUERIES]
+    timed(lambda query: model.index.search(query, 20), queries)
+    return 'zapytań/s', timed(lambda query: model.index.search(query, 20), queries * repeat), 1
+
+
+def bench_filters(ctx, repeat):
+    cases = [(filters, sort_by) for _, filters, sort_by in FILTER_CASES] * repeat
+    return 'zapytań/s', timed(lambda case: utils.get_filtered_apartments(**case[0], sort_by=case[1]), cases), 1
+
+
+def bench_charts(ctx, repeat):
+    pages = [utils.get_filtered_apartments(**filters, sort_by=sort_by) for _, filters, sort_by in FILTER_CASES]
+
+    def render(results):
+        # bez cache wykresów - mierzymy rysowanie, a nie trafienie w cache
+        with utils._chart_cache_lock:
+            utils._chart_cache.clear()
+        utils.create_charts(results)
+
+    return 'stron/s', timed(render, [page for page in pages if page] * repeat), 1
+
+
+def bench_map(ctx, repeat):
+    """GeoJSON mapy z klastrami dla wszystkich zoomów (następca create_map)"""
+    results = utils.get_filtered_apartments(limit=map_data.MAP_MAX_RESULTS)
+    # siatka mapy budowana raz na wersję bazy - poza pomiarem
+    map_data.all_zooms_geojson(results)
+    return 'punktów/s', timed(map_data.all_zooms_geojson, [results] * repeat), len(results)
+
+
+def bench_spatial_join(ctx, repeat):
+    rows = utils.get_read_connection().execute(
+        "SELECT latitude, longitude FROM apartments WHERE latitude IS NOT NULL AND longitude IS NOT NULL").fetchall()
+    latitudes = np.array([row[0] for row in rows])
+    longitudes = np.array([row[1] for row in rows])
+    districts = synthetic_districts(ctx.seed)
+    times = timed(lambda _: match_districts(districts, latitudes, longitudes), range(repeat))
+    return 'punktów/s', times, len(rows)
+
+
+def bench_build_documents(ctx, repeat):
+    frame = pd.read_sql_query("SELECT rowid AS row_id, * FROM apartments ORDER BY rowid LIMIT ?",
+                              utils.get_read_connection(), params=(DOCUMENT_BATCH,))
+    return 'wierszy/s', timed(build_documents, [frame] * repeat), len(frame)
+
+
+COMPONENTS = {
+    'compute_tfidf': bench_compute_tfidf,
+    'search_tfidf': bench_search_tfidf,
+    'index_search': bench_index_search,
+    'filters': bench_filters,
+    'charts': bench_charts,
+    'map': bench_map,
+    'spatial_join': bench_spatial_join,
+    'build_documents': bench_build_documents,
+}
+
+
+# ========== WYNIKI ==========
+
+def summarize(scale, component, unit, times, ops):
+    times = np.array(times)
+    return {
+        'scale': scale,
+        'component': component,
+        'unit': unit,
+        'samples': len(times),
+        'throughput': ops * len(times) / (times.sum() / 1000),
+        'mean_ms': float(times.mean()),
+        'p50_ms': float(np.percentile(times, 50)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'p99_ms': float(np.percentile(times, 99)),
+    }
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+    }
+
+
+def print_result(result):
+    print(f"{result['scale']:>9} {result['component']:<16} {result['throughput']:>14,.1f} {result['unit']:<13} "
+          f"{result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['p99_ms']:>10.2f}")
+
+
+def compare(results, path):
+    with open(path, encoding='utf-8') as f:
+        previous = json.load(f)
+    before = {(r['scale'], r['component']): r for r in previous['results']}
+    print(f"\nporównanie z {path} (commit {previous['meta'].get('commit')}): czas p50 i przepustowość, teraz / wtedy")
+    for result in results:
+        old = before.get((result['scale'], result['component']))
+        if old is None:
+            continue
+        print(f"{result['scale']:>9} {result['component']:<16} p50 {result['p50_ms'] / old['p50_ms']:>6.2f}x   "
+              f"przepustowość {result['throughput'] / old['throughput']:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', default='10000,100000', help='liczby ofert po przecinku')
+    parser.add_argument('--components', default=','.join(COMPONENTS),
+                        help='po przecinku; compute_tfidf i search_tfidf przy 1M ofert potrzebują kilku GB RAM')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'apartments_bench'),
+                        help='katalog na syntetyczne bazy (używane ponownie między uruchomieniami)')
+    parser.add_argument('--rebuild', action='store_true', help='wygeneruj bazy od nowa')
+    parser.add_argument('--workers', type=int, default=0, help='procesów przy generowaniu bazy (0 = liczba rdzeni)')
+    parser.add_argument('--out', help='zapis wyników do pliku JSON')
+    parser.add_argument('--compare', help='plik JSON z poprzedniego uruchomienia')
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    components = args.components.split(',')
+    unknown = [name for name in components if name not in COMPONENTS]
+    if unknown:
+        parser.error(f"nieznane komponenty: {', '.join(unknown)}")
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results = []
+    print(f"{'ofert':>9} {'komponent':<16} {'przepustowość':>14} {'':<13} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for scale in scales:
+        db_path = os.path.join(args.workdir, f'synthetic_{scale}_{args.seed}.db')
+        if args.rebuild or not os.path.exists(db_path):
+            start = time.perf_counter()
+            build_database(db_path, scale, args.seed, workers=args.workers or os.cpu_count() or 1)
+            print(f"  wygenerowano {db_path} w {time.perf_counter() - start:.1f} s")
+        utils.DB_PATH = db_path
+        ctx = Context(args.seed)
+        for name in components:
+            unit, times, ops = COMPONENTS[name](ctx, args.repeat)
+            result = summarize(scale, name, unit, times, ops)
+            results.append(result)
+            print_result(result)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'meta': metadata(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\nwyniki: {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Syntetyczna baza mieszkań w skali 100k-1M ofert do benchmarków.
+
+Wiersze mają kolumny i typy jak CSV z Kaggle (data_prep.CSV_COLUMNS) i
+skorelowane wartości: cena z metrażu i odległości od centrum, rok budowy i
+liczba pięter z typu budynku, POI gęstsze w centrum. Dzielnice to komórki
+Voronoi z nazwami osiedli Wrocławia, a dzielnice, dokumenty, statystyki,
+indeksy i plik indeksu wyszukiwania liczą funkcje z data_prep - dokumenty
+mają więc te same kategorie i słownik co prawdziwa baza.
+
+Uruchomienie z katalogu głównego repo:
+    python -m benchmarks.synthetic --rows 100000 --db synthetic_100k.db [--seed 0] [--workers 0]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_prep
+from district_join import NAME_COLUMN, assign_districts
+from market_stats import create_market_stats
+
+# Rynek we Wrocławiu
+CENTRE = (51.1100, 17.0320)
+BOUNDS = (51.04, 16.82, 51.21, 17.17)   # lat min, lon min, lat max, lon max
+KM_PER_DEG_LAT = 111.2
+KM_PER_DEG_LON = 111.2 * np.cos(np.radians(CENTRE[0]))
+
+DISTRICT_NAMES = [
+    'Stare Miasto', 'Bieńkowice', 'Biskupin - Sępolno - Dąbie - Bartoszowice', 'Borek', 'Brochów',
+    'Gaj', 'Gajowice', 'Gądów - Popowice Płd.', 'Grabiszyn - Grabiszynek', 'Huby', 'Jagodno',
+    'Jerzmanowo - Jarnołtów - Strachowice - Osiniec', 'Karłowice - Różanka', 'Klecina', 'Kleczków',
+    'Kowale', 'Krzyki - Partynice', 'Księże', 'Kuźniki', 'Leśnica', 'Lipa Piotrowska', 'Maślice',
+    'Muchobór Mały', 'Muchobór Wielki', 'Nadodrze', 'Nowy Dwór', 'Oporów', 'Osobowice - Rędzin',
+    'Ołbin', 'Ołtaszyn', 'Pawłowice', 'Pilczyce - Kozanów - Popowice Płn.', 'Plac Grunwaldzki',
+    'Polanowice - Poświętne - Ligota', 'Powstańców Śląskich', 'Pracze Odrzańskie',
+    'Przedmieście Oławskie', 'Przedmieście Świdnickie', 'Psie Pole - Zawidawie', 'Sołtysowice',
+    'Strachocin - Swojczyce - Wojnów', 'Szczepin', 'Tarnogaj', 'Widawa', 'Wojszyce',
+    'Zacisze - Zalesie - Szczytniki', 'Świniary', 'Żerniki',
+]
+
+# typ budynku: (udział, lata budowy, liczba pięter)
+BUILDING_TYPES = {
+    'blockOfFlats': (0.55, (1960, 1995), (4, 12)),
+    'apartmentBuilding': (0.30, (1995, 2024), (3, 9)),
+    'tenement': (0.10, (1880, 1939), (3, 6)),
+}
+
+# średnia odległość do POI (km) w centrum; rośnie z odległością od centrum
+POI_SCALES = {
+    'schoolDistance': 0.35,
+    'clinicDistance': 0.6,
+    'postOfficeDistance': 0.5,
+    'kindergartenDistance': 0.35,
+    'restaurantDistance': 0.25,
+    'collegeDistance': 1.2,
+    'pharmacyDistance': 0.25,
+}
+
+
+# ========== DZIELNICE ==========
+
+def synthetic_districts(seed=0):
+    """komórki Voronoi wokół losowych środków (Stare Miasto w centrum) jako GeoDataFrame w WGS84"""
+    import geopandas as gpd
+    import shapely
+
+    rng = np.random.default_rng([seed, 1])
+    lat_min, lon_min, lat_max, lon_max = BOUNDS
+    seeds = np.column_stack([rng.uniform(lon_min, lon_max, len(DISTRICT_NAMES)),
+                             rng.uniform(lat_min, lat_max, len(DISTRICT_NAMES))])
+    seeds[0] = CENTRE[1], CENTRE[0]
+    points = shapely.points(seeds)
+    area = shapely.box(lon_min, lat_min, lon_max, lat_max)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points), extend_to=area))
+    # voronoi_polygons nie zachowuje kolejności środków - komórka dla każdego środka
+    tree = shapely.STRtree(cells)
+    point_idx, cell_idx = tree.query(points, predicate='within')
+    geometry = shapely.intersection(cells[cell_idx[np.argsort(point_idx)]], area)
+    return gpd.GeoDataFrame({NAME_COLUMN: DISTRICT_NAMES}, geometry=geometry, crs='EPSG:4326')
+
+
+# ========== MIESZKANIA ==========
+
+def _maybe(rng, values, missing):
+    """values z brakami (None) w ułamku missing wierszy"""
+    values = values.astype(object)
+    values[rng.random(len(values)) < missing] = None
+    return values
+
+
+def _yes_no(rng, p_yes, missing=0.0):
+    return _maybe(rng, np.where(rng.random(len(p_yes)) < p_yes, 'yes', 'no'), missing)
+
+
+def generate_apartments(n, rng):
+    """ramka n ofert z kolumnami i typami data_prep.CSV_COLUMNS (miasto: wroclaw)"""
+    lat_min, lon_min, lat_max, lon_max = BOUNDS
+    # skupisko wokół centrum i rzadsze obrzeża
+    lat = np.clip(rng.normal(CENTRE[0], 0.035, n), lat_min, lat_max)
+    lon = np.clip(rng.normal(CENTRE[1], 0.06, n), lon_min, lon_max)
+    centre = np.hypot((lat - CENTRE[0]) * KM_PER_DEG_LAT, (lon - CENTRE[1]) * KM_PER_DEG_LON)
+    urban = np.exp(-centre / 3)
+
+    # kamienice w centrum, apartamentowce raczej na obrzeżach
+    names = list(BUILDING_TYPES)
+    weights = np.array([BUILDING_TYPES[name][0] for name in names])
+    weights = np.outer(np.ones(n), weights)
+    weights[:, names.index('tenement')] *= 0.2 + 4 * urban
+    weights[:, names.index('apartmentBuilding')] *= 1.5 - urban
+    choice = (weights.cumsum(axis=1) / weights.sum(axis=1, keepdims=True) > rng.random((n, 1))).argmax(axis=1)
+    building_type = np.array(names)[choice]
+
+    year = np.zeros(n)
+    floor_count = np.zeros(n)
+    for i, name in enumerate(names):
+        mask = choice == i
+        (y0, y1), (f0, f1) = BUILDING_TYPES[name][1:]
+        year[mask] = rng.integers(y0, y1 + 1, mask.sum())
+        floor_count[mask] = rng.integers(f0, f1 + 1, mask.sum())
+    # kilka procent wieżowców
+    floor_count = np.where(rng.random(n) < 0.03, rng.integers(13, 26, n), floor_count)
+    floor = np.floor(rng.random(n) * (floor_count + 1))
+
+    square = np.round(np.clip(rng.lognormal(np.log(55), 0.35, n), 16, 250), 2)
+    rooms = np.clip(np.round(square / 20 + rng.normal(0, 0.6, n)), 1, 6).astype(np.int64)
+
+    condition = rng.choice(np.array(['premium', 'low', None], dtype=object), n, p=[0.2, 0.15, 0.65])
+    age_factor = np.where(year >= 2010, 1.15, np.where(year < 1945, 1.05, 0.95))
+    condition_factor = np.where(condition == 'premium', 1.2, np.where(condition == 'low', 0.8, 1.0))
+    per_sqm = 12500 * (0.85 + 0.45 * urban) * age_factor * condition_factor * rng.lognormal(0, 0.12, n)
+    price = np.round(square * per_sqm, -2).astype(np.int64)
+
+    concrete = (building_type == 'blockOfFlats') & (year < 1990)
+    material = np.where(concrete & (rng.random(n) < 0.8), 'concreteSlab', 'brick').astype(object)
+    material[rng.random(n) < 0.35] = None
+
+    new = year >= 2000
+    frame = pd.DataFrame({
+        'id': [f'{value:032x}' for value in rng.integers(0, 2 ** 63, n, dtype=np.int64)],
+        'city': 'wroclaw',
+        'type': _maybe(rng, building_type, 0.2),
+        'squareMeters': square,
+        'rooms': rooms,
+        'floor': np.where(rng.random(n) < 0.1, np.nan, floor),
+        'floorCount': np.where(rng.random(n) < 0.05, np.nan, floor_count),
+        'buildYear': np.where(rng.random(n) < 0.2, np.nan, year),
+        'latitude': np.round(lat, 6),
+        'longitude': np.round(lon, 6),
+        'centreDistance': np.round(centre, 2),
+        'poiCount': rng.poisson(3 + 45 * urban),
+        **{col: np.round(rng.exponential(scale * (1 + centre / 4)), 3) for col, scale in POI_SCALES.items()},
+        'ownership': rng.choice(np.array(['condominium', 'cooperative', 'udział'], dtype=object), n,
+                                p=[0.85, 0.13, 0.02]),
+        'buildingMaterial': material,
+        'condition': condition,
+        'hasParkingSpace': _yes_no(rng, np.where(new, 0.8, 0.35), 0.05),
+        'hasBalcony': _yes_no(rng, np.where(building_type == 'tenement', 0.3, 0.7), 0.05),
+        'hasElevator': _yes_no(rng, np.where(floor_count >= 5, 0.9, 0.1), 0.05),
+        'hasSecurity': _yes_no(rng, np.where(new, 0.35, 0.05)),
+        'hasStorageRoom': _yes_no(rng, np.full(n, 0.5)),
+        'price': price,
+    })
+    return frame.astype(data_prep.CSV_COLUMNS)
+
+
+# ========== BAZA ==========
+
+def build_database(db_path, rows, seed=0, chunk_rows=data_prep.CHUNK_ROWS, workers=1):
+    """baza jak z data_prep.full_rebuild (bez ingested_files) i plik indeksu wyszukiwania
+
+    Oferty są generowane i zapisywane partiami po chunk_rows (każda partia z
+    własnego ziarna), więc pamięć nie rośnie ze skalą, a wynik zależy tylko od
+    rows, seed i chunk_rows.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    connection = sqlite3.connect(db_path)
+    data_prep.create_apartments_table(connection)
+    for chunk, start in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, 0, chunk])
+        generate_apartments(min(chunk_rows, rows - start), rng).to_sql(
+            'apartments', connection, if_exists='append', index=False)
+    connection.commit()
+
+    assign_districts(connection, synthetic_districts(seed), batch_size=chunk_rows, workers=workers)
+    data_prep.update_documents(connection, chunk_rows=chunk_rows, workers=workers)
+    create_market_stats(connection)
+    data_prep.create_indexes(connection)
+    connection.close()
+    data_prep.write_search_index(db_path, chunk_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--db', help='domyślnie synthetic_<rows>.db')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=int, default=data_prep.CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=1, help='0 = liczba rdzeni')
+    args = parser.parse_args()
+
+    db_path = args.db or f'synthetic_{args.rows}.db'
+    start = time.perf_counter()
+    build_database(db_path, args.rows, args.seed, args.chunk_rows, args.workers or os.cpu_count() or 1)
+    print(f"{db_path}: {args.rows} ofert w {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
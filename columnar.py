@@ -0,0 +1,158 @@
+import numpy as np
+
+from utils import VALID_SORT, get_read_connection, iter_rows, versioned_cache
+
+# ========== KOLUMNOWA KOPIA TABELI APARTMENTS ==========
+
+NUMERIC_COLUMNS = ['rooms', 'squareMeters', 'price', 'floor', 'floorCount',
+                   'buildYear', 'centreDistance']
+BOOLEAN_COLUMNS = ['hasBalcony', 'hasElevator', 'hasParkingSpace']
+
+# filtr -> (kolumna, operator) - te same warunki co w build_filter_conditions
+RANGE_FILTERS = {
+    'min_rooms': ('rooms', '>='),
+    'min_square': ('squareMeters', '>='),
+    'max_square': ('squareMeters', '<='),
+    'min_price': ('price', '>='),
+    'max_price': ('price', '<='),
+    'min_floor': ('floor', '>='),
+    'max_floor_count': ('floorCount', '<='),
+    'min_build_year': ('buildYear', '>='),
+    'max_centre_distance': ('centreDistance', '<='),
+}
+FLAG_FILTERS = {
+    'balcony': 'hasBalcony',
+    'elevator': 'hasElevator',
+    'parking': 'hasParkingSpace',
+}
+
+
+class ApartmentColumns:
+    """kolumny filtrów w tablicach numpy, wiersze w kolejności rowid
+
+    NULL z SQLite to NaN (porównania z NaN są fałszywe, tak jak z NULL w SQL),
+    dzielnice trzymamy jako kody liczbowe (-1 = brak).
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        columns = ', '.join(['rowid'] + NUMERIC_COLUMNS + BOOLEAN_COLUMNS + ['district_name'])
+        cursor.execute(f'SELECT {columns} FROM apartments ORDER BY rowid')
+        rows = cursor.fetchall()
+
+        n = len(rows)
+        self.row_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+        self.numeric = {}
+        for pos, col in enumerate(NUMERIC_COLUMNS, start=1):
+            self.numeric[col] = np.fromiter(
+                (np.nan if row[pos] is None else row[pos] for row in rows), dtype=np.float64, count=n)
+        self.flags = {}
+        for pos, col in enumerate(BOOLEAN_COLUMNS, start=1 + len(NUMERIC_COLUMNS)):
+            self.flags[col] = np.fromiter((row[pos] == 'yes' for row in rows), dtype=bool, count=n)
+
+        self.district_codes = {}
+        codes = np.full(n, -1, dtype=np.int32)
+        for i, row in enumerate(rows):
+            name = row[-1]
+            if name is not None:
+                codes[i] = self.district_codes.setdefault(name, len(self.district_codes))
+        self.districts = codes
+
+    def after_mask(self, sort_by, after):
+        value, row_id = after
+        if sort_by is None:
+            return self.row_ids > row_id
+        values = self.numeric[sort_by]
+        is_null = np.isnan(values)
+        if value is None:
+            return ~is_null | (self.row_ids > row_id)
+        return ~is_null & ((values > value) | ((values == value) & (self.row_ids > row_id)))
+
+    def mask(self, **filters):
+        """maska wierszy spełniających filtry"""
+        mask = np.ones(len(self.row_ids), dtype=bool)
+        for name, (col, op) in RANGE_FILTERS.items():
+            value = filters.get(name)
+            if value is None:
+                continue
+            values = self.numeric[col]
+            mask &= values >= value if op == '>=' else values <= value
+
+        for name, col in FLAG_FILTERS.items():
+            if filters.get(name) == 'yes':
+                mask &= self.flags[col]
+
+        district = filters.get('district')
+        if district is not None and district != '':
+            code = self.district_codes.get(district)
+            if code is None:
+                mask[:] = False
+            else:
+                mask &= self.districts == code
+        return mask
+
+    def select(self, mask, sort_by=None, limit=50, after=None):
+        """rowid wybranych wierszy w kolejności jak ORDER BY sort_by ASC, rowid ASC w SQLite
+
+        after - kursor (wartość, rowid) jak w utils.build_filter_query
+        """
+        if sort_by not in VALID_SORT:
+            sort_by = None
+        if after is not None:
+            mask = mask & self.after_mask(sort_by, after)
+
+        positions = np.flatnonzero(mask)
+        if sort_by is not None:
+            values = self.numeric[sort_by][positions]
+            is_null = np.isnan(values)
+            # w SQLite NULL jest mniejszy od każdej liczby; lexsort sortuje po ostatnim kluczu
+            order = np.lexsort((self.row_ids[positions], np.where(is_null, 0, values), ~is_null))
+            positions = positions[order]
+        # bez sortowania pozycje są już w kolejności rowid
+        if limit is not None:
+            positions = positions[:limit]
+        return self.row_ids[positions].tolist()
+
+
+@versioned_cache('columns')
+def get_columns(version):
+    """kopia kolumnowa współdzielona przez requesty, przeładowywana po zmianie bazy"""
+    return ApartmentColumns(version)
+
+
+def fetch_rows(row_ids):
+    """pełne wiersze z SQLite tylko dla wybranej strony, w kolejności row_ids"""
+    if not row_ids:
+        return []
+    placeholders = ','.join(['?'] * len(row_ids))
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT rowid AS row_id, * FROM apartments WHERE rowid IN ({placeholders})', row_ids)
+    rows = {row['row_id']: dict(row) for row in cursor.fetchall()}
+
+    return [rows[row_id] for row_id in row_ids]
+
+
+def get_filtered_row_ids(**filters):
+    """odpowiednik utils.get_filtered_row_ids liczony na kopii kolumnowej"""
+    if not any(filters.get(name) is not None for name in RANGE_FILTERS) \
+            and not any(filters.get(name) == 'yes' for name in FLAG_FILTERS) \
+            and filters.get('district') in (None, ''):
+        return None
+    columns = get_columns()
+    return columns.select(columns.mask(**filters), limit=None)
+
+
+def get_filtered_apartments(sort_by=None, after=None, limit=50, **filters):
+    """odpowiednik utils.get_filtered_apartments - te same wiersze w tej samej kolejności"""
+    columns = get_columns()
+    return fetch_rows(columns.select(columns.mask(**filters), sort_by=sort_by, limit=limit, after=after))
+
+
+def iter_filtered_apartments(filters, sort_by=None, after=None, limit=50, fields=None):
+    """odpowiednik utils.iter_filtered_apartments - rowid z kopii kolumnowej, wiersze partiami z SQLite"""
+    columns = get_columns()
+    row_ids = columns.select(columns.mask(**filters), sort_by=sort_by, limit=limit, after=after)
+    return iter_rows(row_ids, fields, sort_by)
@@ -1,340 +1,384 @@
-import pandas as pd
+import argparse
 import glob
+import hashlib
+import json
 import os
+import resource
 import sqlite3
-from lemmatization import lemmatize_text
-
-csv_folder = 'data/'
-sale_files = glob.glob(os.path.join(csv_folder, 'apartments_pl_*.csv'))
-dfs = [pd.read_csv(f) for f in sale_files]
-apartments_sale = pd.concat(dfs, ignore_index=True)
-
-# tylko Wrocław
-apartments_sale = apartments_sale[apartments_sale['city'] == 'wroclaw']
-
-# uzupełnienie braków w kolumnach boolean
-boolean_cols = ['hasParkingSpace', 'hasBalcony', 'hasElevator', 'hasSecurity', 'hasStorageRoom']
-for col in boolean_cols:
-    if col in apartments_sale.columns:
-        apartments_sale[col] = apartments_sale[col].fillna('no')
-
-# usunięcie duplikatów
-apartments_sale = apartments_sale.drop_duplicates()
-
-# FUNKCJE KATEGORII
-
-def price_category(price):
-    cats = []
-    if price < 490000:
-        cats.extend(["tanie", "okazja", "przystępne"])
-    elif price < 600000:
-        cats.append("tanie")
-    elif price < 1000000:
-        pass
-    else:
-        cats.extend(["luksusowe", "premium", "ekskluzywne"])
-    return cats
-
-def size_category(m2):
-    cats = []
-    if m2 < 25:
-        cats.append("bardzo małe")
-        cats.append("kawalerka")
-    elif m2 < 40:
-        cats.append("małe")
-    elif m2 < 55:
-        cats.append("średnie")
-    elif m2 < 70:
-        cats.append("duże")
-    elif m2 < 90:
-        cats.append("bardzo duże")
-    else:
-        cats.extend(["ogromne", "przestronne", "wielkie"])
-    return cats
-
-def rooms_category(rooms):
-    if pd.isna(rooms):
-        return []
-    r = int(rooms)
-    cats = []
-    if r == 1:
-        cats.append("kawalerka")
-    elif r == 2:
-        cats.append("dwupokojowe")
-    elif r == 3:
-        cats.append("trzypokojowe")
-    elif r >= 4:
-        cats.append("czteropokojowe")
-        cats.append("rodzinne")
-    return cats
-
-def floor_category(floor, floor_count):
-    cats = []
-    if pd.isna(floor):
-        return cats
-    
-    f = int(floor)
-    if f == 0:
-        cats.append("parter")
-    elif f == 1:
-        cats.append("pierwsze piętro")
-        cats.append("niskie piętro")
-    elif f <= 3:
-        cats.append("niskie piętro")
-    elif f > 6:
-        cats.append("wysokie piętro")
-    
-    # ostatnie piętro
-    if not pd.isna(floor_count) and f == int(floor_count):
-        cats.append("ostatnie piętro")
-    
-    return cats
-
-def building_height_category(floor_count):
-    if pd.isna(floor_count):
-        return []
-    fc = int(floor_count)
-    if fc <= 2:
-        return ["niski budynek"]
-    elif fc <= 5:
-        return ["średni budynek"]
-    elif fc <= 10:
-        return ["wysoki budynek"]
-    else:
-        return ["wieżowiec"]
-
-def center_category(dist):
-    if pd.isna(dist):
-        return []
-    d = float(dist)
-    if d < 1:
-        return ["ścisłe centrum", "centrum"]
-    elif d < 2:
-        return ["blisko_centrum"]
-    elif d < 4:
-        return ["niedaleko centrum"]
-    elif d < 6:
-        return ["daleko od centrum"]
-    else:
-        return ["bardzo daleko od centrum", "peryferie"]
-
-def year_category(year):
-    if pd.isna(year):
-        return []
-    y = int(year)
-    cats = []
-    if y >= 2020:
-        cats.extend(["nowe", "nowoczesne", "świeżo wybudowane"])
-    elif y >= 2010:
-        cats.extend(["nowe", "współczesne"])
-    elif y >= 2000:
-        cats.append("współczesne")
-    elif y >= 1990:
-        cats.append("z lat 90")
-    elif y >= 1980:
-        cats.extend(["stare", "PRL"])
-    elif y >= 1960:
-        cats.extend(["stare", "PRL", "blok z PRL"])
-    else:
-        cats.extend(["bardzo stare", "przedwojenne"])
-    return cats
-
-def poi_distance_category(dist, poi_name):
-    if pd.isna(dist):
-        return []
-    d = float(dist)
-    if d < 0.2:
-        return [f"bardzo_blisko_{poi_name}"]
-    elif d < 0.5:
-        return [f"blisko_{poi_name}"]
-    else:
-        return []
-
-def ownership_category(ownership):
-    if pd.isna(ownership):
-        return []
-    if ownership == "condominium":
-        return ["własnościowe"]
-    elif ownership == "cooperative":
-        return ["spółdzielcze"]
-    else:
-        return []
-
-def condition_category(condition):
-    if pd.isna(condition):
-        return []
-    if condition == "premium":
-        return ["premium", "luksusowy stan", "wykończone"]
-    elif condition == "low":
-        return ["niski stan", "do remontu", "do odnowienia"]
-    else:
-        return []
-
-def building_material_category(material):
-    if pd.isna(material):
-        return []
-    if material == "brick":
-        return ["cegła", "ceglany"]
-    elif material == "concreteSlab":
-        return ["wielka płyta", "betonowy"]
-    else:
-        return []
-
-def building_type_category(building_type):
-    if pd.isna(building_type):
-        return []
-    if building_type == "blockOfFlats":
-        return ["blok", "blok mieszkalny"]
-    elif building_type == "apartmentBuilding":
-        return ["apartamentowiec", "budynek mieszkalny"]
-    elif building_type == "tenement":
-        return ["kamienica"]
-    else:
-        return []
-
-
-def make_document(row):
-    parts = []
-    
-    parts += size_category(row["squareMeters"])
-    parts += price_category(row["price"])
-    parts += rooms_category(row.get("rooms"))
-    parts += floor_category(row.get("floor"), row.get("floorCount"))
-    parts += building_height_category(row.get("floorCount"))
-    parts += building_type_category(row.get("type"))
-    parts += center_category(row.get("centreDistance"))
-    parts += year_category(row.get("buildYear"))
-    parts += ownership_category(row.get("ownership"))
-    parts += condition_category(row.get("condition"))
-    parts += building_material_category(row.get("buildingMaterial"))
-    
-    # cechy bool
-    if row.get("hasBalcony") == "yes":
-        parts.append("balkon")
-    if row.get("hasElevator") == "yes":
-        parts.append("winda")
-    if row.get("hasParkingSpace") == "yes":
-        parts.append("parking")
-    if row.get("hasSecurity") == "yes":
-        parts.append("ochrona")
-    if row.get("hasStorageRoom") == "yes":
-        parts.append("piwnica")
-    
-    # odległości
-    parts += poi_distance_category(row.get("schoolDistance"), "szkoła")
-    parts += poi_distance_category(row.get("clinicDistance"), "klinika")
-    parts += poi_distance_category(row.get("kindergartenDistance"), "przedszkole")
-    parts += poi_distance_category(row.get("pharmacyDistance"), "apteka")
-    parts += poi_distance_category(row.get("restaurantDistance"), "restauracja")
-    parts += poi_distance_category(row.get("collegeDistance"), "uczelnia")
-    parts += poi_distance_category(row.get("postOfficeDistance"), "poczta")
-    
-    # dzielnica
-    if row.get("district_name") is not None and row.get("district_name") != '':
-        district_full = row["district_name"].lower()
-        # dzielenie po '-' i dodanie każdej części osobno
-        # dla kilku dzielnic w apartments.db np ' Pilczyce - Kozanów - Popowice Płn.'
-        district_parts = [part.strip() for part in district_full.split(' - ')]
-        parts.extend(district_parts)
-    
-    doc = " ".join(parts)
-    return lemmatize_text(doc)
-
-apartments_sale['document'] = apartments_sale.apply(make_document, axis=1)
-apartments_sale['district_name'] = None
-
-connection = sqlite3.connect('apartments_sale.db')
-apartments_sale.to_sql('apartments', connection, if_exists='replace', index=False)
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from documents import build_documents
+from index_file import build_index_arrays, db_signature, index_path, read_index, write_index
+from market_stats import create_market_stats, refresh_market_stats
+from parallel import ordered_map
+
+CSV_FOLDER = 'data/'
+CSV_PATTERN = 'apartments_pl_*.csv'
+DB_PATH = os.environ.get('APARTMENTS_DB', 'apartments_sale.db')
+
+BOOLEAN_COLS = ['hasParkingSpace', 'hasBalcony', 'hasElevator', 'hasSecurity', 'hasStorageRoom']
+
+# kolumny CSV z Kaggle z jawnymi typami (jak wnioskował je pandas dla całych plików);
+# inne kolumny nie są wczytywane, a każdy kawałek pliku ma te same typy w SQLite
+CSV_COLUMNS = {
+    'id': 'str',
+    'city': 'str',
+    'type': 'str',
+    'squareMeters': 'float64',
+    'rooms': 'Int64',
+    'floor': 'float64',
+    'floorCount': 'float64',
+    'buildYear': 'float64',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'centreDistance': 'float64',
+    'poiCount': 'Int64',
+    'schoolDistance': 'float64',
+    'clinicDistance': 'float64',
+    'postOfficeDistance': 'float64',
+    'kindergartenDistance': 'float64',
+    'restaurantDistance': 'float64',
+    'collegeDistance': 'float64',
+    'pharmacyDistance': 'float64',
+    'ownership': 'str',
+    'buildingMaterial': 'str',
+    'condition': 'str',
+    'hasParkingSpace': 'str',
+    'hasBalcony': 'str',
+    'hasElevator': 'str',
+    'hasSecurity': 'str',
+    'hasStorageRoom': 'str',
+    'price': 'Int64',
+}
+
+# wierszy wczytywanych z CSV / czytanych z bazy naraz
+CHUNK_ROWS = 10000
+
+# kolumny liczone w data_prep, a nie brane z CSV
+DERIVED_COLUMNS = ['document', 'district_name']
+
+
+def snapshot_files(folder=CSV_FOLDER):
+    # nazwy z rokiem i miesiącem - posortowane to kolejność chronologiczna
+    return sorted(glob.glob(os.path.join(folder, CSV_PATTERN)))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_snapshot_chunks(path, chunk_rows=CHUNK_ROWS):
+    """plik CSV kawałkami po chunk_rows wierszy - tylko znane kolumny, tylko Wrocław"""
+    reader = pd.read_csv(path, usecols=lambda col: col in CSV_COLUMNS, dtype=CSV_COLUMNS, chunksize=chunk_rows)
+    for chunk in reader:
+        # tylko Wrocław
+        chunk = chunk[chunk['city'] == 'wroclaw']
+
+        # uzupełnienie braków w kolumnach boolean
+        for col in BOOLEAN_COLS:
+            if col in chunk.columns:
+                chunk[col] = chunk[col].fillna('no')
+
+        # brakująca kolumna w starszym pliku - NULL, ta sama kolejność i typy w każdym kawałku
+        yield chunk.reindex(columns=list(CSV_COLUMNS)).astype(CSV_COLUMNS)
+
+
+def stream_snapshots(connection, files, table, chunk_rows=CHUNK_ROWS):
+    """zapis plików do tabeli SQLite kawałek po kawałku - w pamięci jest tylko jeden kawałek"""
+    total = 0
+    if_exists = 'replace'
+    for path in files:
+        for chunk in read_snapshot_chunks(path, chunk_rows):
+            chunk.to_sql(table, connection, if_exists=if_exists, index=False)
+            if_exists = 'append'
+            total += len(chunk)
+    connection.commit()
+    return total
+
+
+def peak_rss_mb():
+    """szczytowe zużycie pamięci procesu (ru_maxrss: KB na Linuksie, bajty na macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
 
 
 # ========== DODAWANIE DZIELNIC Z SHAPEFILE ==========
 
-try:
-    import geopandas as gpd
-    from shapely.geometry import Point
-    
-    SHAPEFILE_PATH = 'location/GraniceOsiedli.shp'
-    
-    districts = gpd.read_file(SHAPEFILE_PATH, encoding='utf-8')
-    name_column = 'NAZWAOSIED'
-    
-    # konwertuj do WGS84
-    if districts.crs != 'EPSG:4326':
-        districts = districts.to_crs('EPSG:4326')
-        
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT id, latitude, longitude 
-        FROM apartments 
-        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
-    """)
-    apartments = cursor.fetchall()
-    
-    matched = 0
-    not_matched = 0
-    
+def add_districts(connection, row_ids=None, chunk_rows=CHUNK_ROWS, workers=1):
     try:
-        from tqdm import tqdm
-        iterator = tqdm(apartments, desc="dopasowywanie dzielnic")
+        from district_join import SHAPEFILE_PATH, assign_districts, load_districts
+
+        districts = load_districts(SHAPEFILE_PATH)
+        matched, not_matched = assign_districts(connection, districts, row_ids=row_ids,
+                                               batch_size=chunk_rows, workers=workers)
+
+        print(f"dzielnice: dopasowano dokladnie {matched}, najblizsze {not_matched}")
+
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT district_name, COUNT(*) as count
+            FROM apartments
+            WHERE district_name IS NOT NULL
+            GROUP BY district_name
+            ORDER BY count DESC
+            LIMIT 10
+        """)
+
+        print("\ntop 10 dzielnic:")
+        for district, count in cursor.fetchall():
+            print(f"  {district}: {count} mieszkań")
+
     except ImportError:
-        iterator = apartments
-    
-    for apt_id, lat, lon in iterator:
-        point = Point(lon, lat)
-        containing_district = districts[districts.contains(point)]
-        
-        if not containing_district.empty:
-            district_name = containing_district.iloc[0][name_column]
-            cursor.execute(
-                "UPDATE apartments SET district_name = ? WHERE id = ?",
-                (district_name, apt_id)
-            )
-            matched += 1
-        else:
-            distances = districts.geometry.distance(point)
-            nearest_idx = distances.idxmin()
-            district_name = districts.loc[nearest_idx, name_column]
-            cursor.execute(
-                "UPDATE apartments SET district_name = ? WHERE id = ?",
-                (district_name, apt_id)
-            )
-            not_matched += 1
-    
+        print("brak geopandas - pomijam dzielnice")
+    except FileNotFoundError:
+        print(f"brak {SHAPEFILE_PATH} - pomijam dzielnice")
+    except Exception as e:
+        print(f"blad przy dzielnicach: {e}")
+
+
+# ========== DOKUMENTY ==========
+
+def update_documents(connection, row_ids=None, chunk_rows=CHUNK_ROWS, workers=1):
+    """dokumenty liczone raz, po dzielnicach, z wierszy zapisanych w bazie (row_ids=None - wszystkie)
+
+    Wiersze są czytane partiami po rowid, więc w pamięci jest najwyżej chunk_rows wierszy
+    (2 * workers partii, gdy dokumenty liczy pula procesów). Zapis w kolejności partii.
+    """
+    def batches():
+        if row_ids is not None:
+            for start in range(0, len(row_ids), chunk_rows):
+                yield pd.read_sql_query(
+                    "SELECT rowid AS row_id, * FROM apartments WHERE rowid IN (SELECT value FROM json_each(?))"
+                    " ORDER BY rowid", connection, params=(json.dumps(list(row_ids[start:start + chunk_rows])),))
+            return
+        last = 0
+        while True:
+            batch = pd.read_sql_query("SELECT rowid AS row_id, * FROM apartments WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                      connection, params=(last, chunk_rows))
+            if batch.empty:
+                return
+            last = int(batch['row_id'].iloc[-1])
+            yield batch
+
+    for apartments, documents in ordered_map(build_documents, batches(), workers):
+        connection.executemany("UPDATE apartments SET document = ? WHERE rowid = ?",
+                               zip(documents, apartments['row_id'].tolist()))
     connection.commit()
-    
-    connection.row_factory = sqlite3.Row
+
+
+# ========== INDEKSY ==========
+
+# kolumny sortowania i filtrów zakresowych z formularza; rowid jest dopisywany
+# do każdego indeksu przez SQLite, więc obsługują też ORDER BY kolumna, rowid
+APARTMENT_INDEXES = {
+    'idx_apartments_price': ['price'],
+    'idx_apartments_square': ['squareMeters'],
+    'idx_apartments_rooms': ['rooms'],
+    'idx_apartments_floor': ['floor'],
+    'idx_apartments_floor_count': ['floorCount'],
+    'idx_apartments_build_year': ['buildYear'],
+    'idx_apartments_centre': ['centreDistance'],
+    'idx_apartments_district_price': ['district_name', 'price'],
+    # dopasowanie ofert po id przy ingeście przyrostowym
+    'idx_apartments_id': ['id'],
+}
+
+def create_indexes(connection):
     cursor = connection.cursor()
-    cursor.execute("SELECT * FROM apartments")
-    rows = cursor.fetchall()
-    
-    for row in rows:
-        row_dict = dict(row)
-        new_doc = make_document(row_dict)
-        cursor.execute("UPDATE apartments SET document = ? WHERE id = ?", 
-                      (new_doc, row_dict['id']))
-    
+    for name, columns in APARTMENT_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON apartments ({', '.join(columns)})")
+    # statystyki dla planera zapytań
+    cursor.execute("ANALYZE")
+    connection.commit()
+
+
+# ========== WCZYTANE PLIKI ==========
+
+INGESTED_FILES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT NOT NULL,
+    sha256 TEXT PRIMARY KEY,
+    ingested_at TEXT NOT NULL
+)
+"""
+
+def record_files(connection, files):
+    """zapis plików (z hashem treści), które są już w bazie"""
+    connection.execute(INGESTED_FILES_SCHEMA)
+    now = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    connection.executemany("INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?)",
+                           [(path, sha256, now) for path, sha256 in files])
     connection.commit()
-    
-    print(f"dzielnice: dopasowano dokladnie {matched}, najblizsze {not_matched}")
-
-    cursor.execute("""
-        SELECT district_name, COUNT(*) as count 
-        FROM apartments 
-        WHERE district_name IS NOT NULL
-        GROUP BY district_name 
-        ORDER BY count DESC 
-        LIMIT 10
+
+def new_files(connection, files):
+    """pliki, których treści (sha256) jeszcze nie wczytano - zmieniony plik pod starą nazwą też jest nowy"""
+    connection.execute(INGESTED_FILES_SCHEMA)
+    known = {row[0] for row in connection.execute("SELECT sha256 FROM ingested_files")}
+    hashes = [(path, file_sha256(path)) for path in files]
+    return [(path, sha256) for path, sha256 in hashes if sha256 not in known]
+
+
+# ========== PRZEBUDOWA / INGEST PRZYROSTOWY ==========
+
+def create_apartments_table(connection):
+    """pusta tabela apartments o typach kolumn z CSV_COLUMNS (jak z to_sql całej ramki)"""
+    empty = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in CSV_COLUMNS.items()})
+    for col in DERIVED_COLUMNS:
+        empty[col] = pd.Series(dtype=object)
+    empty.to_sql('apartments', connection, if_exists='replace', index=False)
+
+def full_rebuild(connection, files, chunk_rows=CHUNK_ROWS, workers=1):
+    stream_snapshots(connection, files, 'staging_apartments', chunk_rows)
+
+    # pusta tabela, potem jeden wiersz na ofertę
+    create_apartments_table(connection)
+
+    # ta sama reguła co w upsert_apartments: z kilku wersji oferty (id) zostaje
+    # wersja z najnowszego pliku, więc przebudowa i ingest przyrostowy dają tę samą tabelę
+    quoted = ', '.join(f'"{col}"' for col in CSV_COLUMNS)
+    connection.execute(f"""
+        INSERT INTO apartments ({quoted})
+        SELECT {quoted} FROM staging_apartments
+        WHERE rowid IN (SELECT MAX(rowid) FROM staging_apartments GROUP BY id)
+        ORDER BY rowid
     """)
-    
-    print("\ntop 10 dzielnic:")
-    for district, count in cursor.fetchall():
-        print(f"  {district}: {count} mieszkań")
-    
-except ImportError:
-    print("brak geopandas - pomijam dzielnice")
-except FileNotFoundError:
-    print(f"brak {SHAPEFILE_PATH} - pomijam dzielnice")
-except Exception as e:
-    print(f"blad przy dzielnicach: {e}")
-
-connection.close()
\ No newline at end of file
+    connection.execute("DROP TABLE staging_apartments")
+    connection.commit()
+
+    add_districts(connection, chunk_rows=chunk_rows, workers=workers)
+    update_documents(connection, chunk_rows=chunk_rows, workers=workers)
+    create_market_stats(connection)
+    create_indexes(connection)
+
+    connection.execute("DROP TABLE IF EXISTS ingested_files")
+    record_files(connection, [(path, file_sha256(path)) for path in files])
+
+def upsert_apartments(connection, table):
+    """wstawia nowe oferty z tabeli table i aktualizuje istniejące po id; zwraca rowid zmienionych wierszy"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT name FROM pragma_table_info('apartments')")
+    table_columns = [row[0] for row in cursor.fetchall()]
+    columns = [col for col in CSV_COLUMNS if col in table_columns]
+    missing = [col for col in CSV_COLUMNS if col not in table_columns]
+    if missing:
+        print(f"kolumny spoza tabeli apartments - pomijam: {', '.join(missing)}")
+
+    quoted = [f'"{col}"' for col in columns]
+    data_columns = [col for col in quoted if col != '"id"']
+    # ta sama oferta w kilku nowych plikach - zostaje wersja z najnowszego
+    latest = f"i.rowid IN (SELECT MAX(rowid) FROM {table} GROUP BY id)"
+    # tylko wiersze, w których coś się zmieniło - reszta nie wymaga przeliczania
+    changed = ' OR '.join(f'apartments.{col} IS NOT i.{col}' for col in data_columns) or '0'
+    cursor.execute(f"""
+        UPDATE apartments SET {', '.join(f'{col} = i.{col}' for col in data_columns) or 'id = i.id'}
+        FROM {table} AS i
+        WHERE apartments.id = i.id AND {latest} AND ({changed})
+        RETURNING apartments.rowid
+    """)
+    updated = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"""
+        INSERT INTO apartments ({', '.join(quoted)})
+        SELECT {', '.join(quoted)} FROM {table} AS i
+        WHERE {latest} AND NOT EXISTS (SELECT 1 FROM apartments WHERE apartments.id = i.id)
+        ORDER BY i.rowid
+        RETURNING rowid
+    """)
+    inserted = [row[0] for row in cursor.fetchall()]
+    connection.commit()
+    return updated, inserted
+
+def table_exists(connection, name):
+    cursor = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def incremental_update(connection, files, chunk_rows=CHUNK_ROWS, workers=1):
+    if not table_exists(connection, 'apartments'):
+        print("brak tabeli apartments - pełna przebudowa")
+        full_rebuild(connection, files, chunk_rows, workers)
+        return
+
+    pending = new_files(connection, files)
+    if not pending:
+        print("brak nowych plików")
+        return
+    for path, _ in pending:
+        print(f"nowy plik: {path}")
+
+    stream_snapshots(connection, [path for path, _ in pending], 'incoming_apartments', chunk_rows)
+    updated, inserted = upsert_apartments(connection, 'incoming_apartments')
+    connection.execute("DROP TABLE incoming_apartments")
+    connection.commit()
+    touched = updated + inserted
+    print(f"zaktualizowano {len(updated)}, dodano {len(inserted)} mieszkań")
+
+    if touched:
+        # dzielnice i dokumenty tylko dla zmienionych wierszy, liczniki statystyk poprawiły triggery
+        add_districts(connection, row_ids=touched, chunk_rows=chunk_rows, workers=workers)
+        update_documents(connection, row_ids=touched, chunk_rows=chunk_rows, workers=workers)
+    if table_exists(connection, 'market_stats'):
+        refresh_market_stats(connection)
+    else:
+        # baza sprzed statystyk - liczone od zera razem z triggerami
+        create_market_stats(connection)
+    create_indexes(connection)
+    record_files(connection, pending)
+
+
+# ========== PLIK INDEKSU WYSZUKIWANIA ==========
+
+def write_search_index(db_path, chunk_rows=CHUNK_ROWS):
+    """indeks tf-idf dla aplikacji (mmap) - po ostatnim zapisie do bazy, bo pamięta jej sygnaturę"""
+    path = index_path(db_path)
+    signature = db_signature(db_path)
+    try:
+        header, _ = read_index(path)
+        if header['db_signature'] == signature:
+            print(f"indeks wyszukiwania {path} aktualny")
+            return
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # tylko do odczytu - odczyt nie może zmienić sygnatury pliku bazy
+    connection = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    arrays = build_index_arrays(connection, chunk_rows)
+    connection.close()
+    size = write_index(arrays, path, signature)
+    print(f"indeks wyszukiwania: {path} ({size / (1024 * 1024):.1f} MB, {len(arrays['row_ids'])} dokumentów)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--data', default=CSV_FOLDER, help='folder z plikami apartments_pl_*.csv')
+    parser.add_argument('--incremental', action='store_true',
+                        help='tylko nowe pliki CSV, upsert po id zamiast przebudowy tabeli')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='wierszy CSV / bazy przetwarzanych naraz (ogranicza zużycie pamięci)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='procesów liczących dzielnice i dokumenty (0 = liczba rdzeni); wynik jak przy 1')
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+
+    files = snapshot_files(args.data)
+    connection = sqlite3.connect(args.db)
+    if args.incremental:
+        incremental_update(connection, files, args.chunk_rows, workers)
+    else:
+        full_rebuild(connection, files, args.chunk_rows, workers)
+    connection.close()
+    write_search_index(args.db, args.chunk_rows)
+    print(f"\nszczytowe RSS: {peak_rss_mb():.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
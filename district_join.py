@@ -0,0 +1,150 @@
+import json
+
+import numpy as np
+
+# ========== SPATIAL JOIN DZIELNIC ==========
+
+SHAPEFILE_PATH = 'location/GraniceOsiedli.shp'
+NAME_COLUMN = 'NAZWAOSIED'
+
+
+def load_districts(path=SHAPEFILE_PATH):
+    """granice osiedli w WGS84 (jak współrzędne mieszkań)"""
+    import geopandas as gpd
+
+    districts = gpd.read_file(path, encoding='utf-8')
+    # konwertuj do WGS84
+    if districts.crs != 'EPSG:4326':
+        districts = districts.to_crs('EPSG:4326')
+    return districts
+
+
+def _lowest_per_point(point_idx, polygon_idx, n):
+    """dla każdego punktu najmniejszy pasujący indeks wielokąta, -1 = brak"""
+    result = np.full(n, -1, dtype=np.int64)
+    # od największego indeksu, więc przy powtórzeniach punktu zostaje najmniejszy
+    order = np.lexsort((-polygon_idx, point_idx))
+    result[point_idx[order]] = polygon_idx[order]
+    return result
+
+
+def match_districts(districts, latitudes, longitudes, tree=None):
+    """pozycja dzielnicy (wiersz districts) dla każdego punktu i maska dopasowań dokładnych
+
+    Zawieranie przez zapytanie do STRtree całą tablicą punktów, dla punktów
+    poza wszystkimi wielokątami - najbliższy wielokąt. Przy kilku trafieniach
+    wygrywa pierwszy wielokąt w pliku, tak jak iloc[0] / idxmin w
+    match_districts_loop. tree - drzewo z poprzedniej partii punktów.
+    """
+    import shapely
+
+    points = shapely.points(np.asarray(longitudes, dtype=np.float64), np.asarray(latitudes, dtype=np.float64))
+    if tree is None:
+        tree = shapely.STRtree(districts.geometry.values)
+
+    point_idx, polygon_idx = tree.query(points, predicate='within')
+    positions = _lowest_per_point(point_idx, polygon_idx, len(points))
+    exact = positions >= 0
+
+    missing = np.flatnonzero(~exact)
+    if len(missing):
+        # all_matches - wszystkie wielokąty w tej samej minimalnej odległości
+        point_idx, polygon_idx = tree.query_nearest(points[missing], all_matches=True)
+        positions[missing] = _lowest_per_point(point_idx, polygon_idx, len(missing))
+    return positions, exact
+
+
+def match_districts_loop(districts, latitudes, longitudes):
+    """poprzednia wersja: contains / distance po wszystkich wielokątach dla każdego punktu osobno"""
+    import warnings
+
+    from shapely.geometry import Point
+
+    positions = np.full(len(latitudes), -1, dtype=np.int64)
+    exact = np.zeros(len(latitudes), dtype=bool)
+    for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+        point = Point(lon, lat)
+        containing = np.flatnonzero(districts.contains(point).to_numpy())
+        if len(containing):
+            positions[i] = containing[0]
+            exact[i] = True
+        else:
+            # odległości w stopniach - geopandas ostrzega o CRS geograficznym przy każdym punkcie
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)
+                positions[i] = int(np.argmin(districts.geometry.distance(point).to_numpy()))
+    return positions, exact
+
+
+# stan procesu liczącego dopasowania (w puli - osobny w każdym procesie)
+_worker_districts = None
+_worker_tree = None
+
+
+def _init_worker(districts):
+    """jedno STRtree na proces, a nie na partię"""
+    import shapely
+
+    global _worker_districts, _worker_tree
+    _worker_districts = districts
+    _worker_tree = shapely.STRtree(districts.geometry.values)
+
+
+def _match_batch(apartments):
+    return match_districts(_worker_districts, [row[2] for row in apartments],
+                           [row[3] for row in apartments], tree=_worker_tree)
+
+
+def assign_districts(connection, districts, name_column=NAME_COLUMN, row_ids=None, batch_size=10000, workers=1):
+    """ustawia apartments.district_name jednym UPDATE ... FROM z tabeli tymczasowej
+
+    Punkty są dopasowywane partiami po batch_size wierszy (jedno STRtree dla
+    wszystkich partii). row_ids - tylko te wiersze (ingest przyrostowy),
+    None = cała tabela. workers > 1 - partie liczone w puli procesów, zapis
+    wyników w kolejności partii, więc wynik jak przy workers=1. Zwraca (liczba
+    dopasowań dokładnych, liczba dopasowań do najbliższej).
+    """
+    from parallel import ordered_map
+
+    names = districts[name_column].to_numpy()
+    cursor = connection.cursor()
+    query = """
+        SELECT rowid, id, latitude, longitude
+        FROM apartments
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND rowid > ?
+    """
+    filter_params = ()
+    if row_ids is not None:
+        query += " AND rowid IN (SELECT value FROM json_each(?))"
+        filter_params = (json.dumps(list(row_ids)),)
+    query += " ORDER BY rowid LIMIT ?"
+
+    def batches():
+        last = 0
+        while True:
+            apartments = connection.execute(query, (last,) + filter_params + (batch_size,)).fetchall()
+            if not apartments:
+                return
+            last = apartments[-1][0]
+            yield apartments
+
+    # UPDATE szło po id, więc przy powtórzonym id wygrywa ostatni wiersz - INSERT OR REPLACE robi to samo
+    cursor.execute("DROP TABLE IF EXISTS temp.district_matches")
+    cursor.execute("CREATE TEMP TABLE district_matches (id TEXT PRIMARY KEY, district_name TEXT)")
+
+    matched = not_matched = 0
+    for apartments, (positions, exact) in ordered_map(_match_batch, batches(), workers,
+                                                      initializer=_init_worker, initargs=(districts,)):
+        cursor.executemany("INSERT OR REPLACE INTO temp.district_matches VALUES (?, ?)",
+                           zip([row[1] for row in apartments], names[positions].tolist()))
+        matched += int(exact.sum())
+        not_matched += len(apartments) - int(exact.sum())
+
+    cursor.execute("""
+        UPDATE apartments SET district_name = m.district_name
+        FROM temp.district_matches AS m
+        WHERE apartments.id = m.id
+    """)
+    cursor.execute("DROP TABLE temp.district_matches")
+    connection.commit()
+    return matched, not_matched
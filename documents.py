@@ -0,0 +1,348 @@
+import numpy as np
+import pandas as pd
+
+from lemmatization import lemmatize_text
+
+# ========== DOKUMENTY MIESZKAŃ (TOKENY KATEGORII) ==========
+
+# FUNKCJE KATEGORII (wiersz po wierszu)
+
+def price_category(price):
+    cats = []
+    if price < 490000:
+        cats.extend(["tanie", "okazja", "przystępne"])
+    elif price < 600000:
+        cats.append("tanie")
+    elif price < 1000000:
+        pass
+    else:
+        cats.extend(["luksusowe", "premium", "ekskluzywne"])
+    return cats
+
+def size_category(m2):
+    cats = []
+    if m2 < 25:
+        cats.append("bardzo małe")
+        cats.append("kawalerka")
+    elif m2 < 40:
+        cats.append("małe")
+    elif m2 < 55:
+        cats.append("średnie")
+    elif m2 < 70:
+        cats.append("duże")
+    elif m2 < 90:
+        cats.append("bardzo duże")
+    else:
+        cats.extend(["ogromne", "przestronne", "wielkie"])
+    return cats
+
+def rooms_category(rooms):
+    if pd.isna(rooms):
+        return []
+    r = int(rooms)
+    cats = []
+    if r == 1:
+        cats.append("kawalerka")
+    elif r == 2:
+        cats.append("dwupokojowe")
+    elif r == 3:
+        cats.append("trzypokojowe")
+    elif r >= 4:
+        cats.append("czteropokojowe")
+        cats.append("rodzinne")
+    return cats
+
+def floor_category(floor, floor_count):
+    cats = []
+    if pd.isna(floor):
+        return cats
+    
+    f = int(floor)
+    if f == 0:
+        cats.append("parter")
+    elif f == 1:
+        cats.append("pierwsze piętro")
+        cats.append("niskie piętro")
+    elif f <= 3:
+        cats.append("niskie piętro")
+    elif f > 6:
+        cats.append("wysokie piętro")
+    
+    # ostatnie piętro
+    if not pd.isna(floor_count) and f == int(floor_count):
+        cats.append("ostatnie piętro")
+    
+    return cats
+
+def building_height_category(floor_count):
+    if pd.isna(floor_count):
+        return []
+    fc = int(floor_count)
+    if fc <= 2:
+        return ["niski budynek"]
+    elif fc <= 5:
+        return ["średni budynek"]
+    elif fc <= 10:
+        return ["wysoki budynek"]
+    else:
+        return ["wieżowiec"]
+
+def center_category(dist):
+    if pd.isna(dist):
+        return []
+    d = float(dist)
+    if d < 1:
+        return ["ścisłe centrum", "centrum"]
+    elif d < 2:
+        return ["blisko_centrum"]
+    elif d < 4:
+        return ["niedaleko centrum"]
+    elif d < 6:
+        return ["daleko od centrum"]
+    else:
+        return ["bardzo daleko od centrum", "peryferie"]
+
+def year_category(year):
+    if pd.isna(year):
+        return []
+    y = int(year)
+    cats = []
+    if y >= 2020:
+        cats.extend(["nowe", "nowoczesne", "świeżo wybudowane"])
+    elif y >= 2010:
+        cats.extend(["nowe", "współczesne"])
+    elif y >= 2000:
+        cats.append("współczesne")
+    elif y >= 1990:
+        cats.append("z lat 90")
+    elif y >= 1980:
+        cats.extend(["stare", "PRL"])
+    elif y >= 1960:
+        cats.extend(["stare", "PRL", "blok z PRL"])
+    else:
+        cats.extend(["bardzo stare", "przedwojenne"])
+    return cats
+
+def poi_distance_category(dist, poi_name):
+    if pd.isna(dist):
+        return []
+    d = float(dist)
+    if d < 0.2:
+        return [f"bardzo_blisko_{poi_name}"]
+    elif d < 0.5:
+        return [f"blisko_{poi_name}"]
+    else:
+        return []
+
+def ownership_category(ownership):
+    if pd.isna(ownership):
+        return []
+    if ownership == "condominium":
+        return ["własnościowe"]
+    elif ownership == "cooperative":
+        return ["spółdzielcze"]
+    else:
+        return []
+
+def condition_category(condition):
+    if pd.isna(condition):
+        return []
+    if condition == "premium":
+        return ["premium", "luksusowy stan", "wykończone"]
+    elif condition == "low":
+        return ["niski stan", "do remontu", "do odnowienia"]
+    else:
+        return []
+
+def building_material_category(material):
+    if pd.isna(material):
+        return []
+    if material == "brick":
+        return ["cegła", "ceglany"]
+    elif material == "concreteSlab":
+        return ["wielka płyta", "betonowy"]
+    else:
+        return []
+
+def building_type_category(building_type):
+    if pd.isna(building_type):
+        return []
+    if building_type == "blockOfFlats":
+        return ["blok", "blok mieszkalny"]
+    elif building_type == "apartmentBuilding":
+        return ["apartamentowiec", "budynek mieszkalny"]
+    elif building_type == "tenement":
+        return ["kamienica"]
+    else:
+        return []
+
+
+def document_text(row):
+    """etykiety kategorii jednego wiersza przed lematyzacją"""
+    parts = []
+    
+    parts += size_category(row["squareMeters"])
+    parts += price_category(row["price"])
+    parts += rooms_category(row.get("rooms"))
+    parts += floor_category(row.get("floor"), row.get("floorCount"))
+    parts += building_height_category(row.get("floorCount"))
+    parts += building_type_category(row.get("type"))
+    parts += center_category(row.get("centreDistance"))
+    parts += year_category(row.get("buildYear"))
+    parts += ownership_category(row.get("ownership"))
+    parts += condition_category(row.get("condition"))
+    parts += building_material_category(row.get("buildingMaterial"))
+    
+    # cechy bool
+    if row.get("hasBalcony") == "yes":
+        parts.append("balkon")
+    if row.get("hasElevator") == "yes":
+        parts.append("winda")
+    if row.get("hasParkingSpace") == "yes":
+        parts.append("parking")
+    if row.get("hasSecurity") == "yes":
+        parts.append("ochrona")
+    if row.get("hasStorageRoom") == "yes":
+        parts.append("piwnica")
+    
+    # odległości
+    parts += poi_distance_category(row.get("schoolDistance"), "szkoła")
+    parts += poi_distance_category(row.get("clinicDistance"), "klinika")
+    parts += poi_distance_category(row.get("kindergartenDistance"), "przedszkole")
+    parts += poi_distance_category(row.get("pharmacyDistance"), "apteka")
+    parts += poi_distance_category(row.get("restaurantDistance"), "restauracja")
+    parts += poi_distance_category(row.get("collegeDistance"), "uczelnia")
+    parts += poi_distance_category(row.get("postOfficeDistance"), "poczta")
+    
+    # dzielnica
+    if row.get("district_name") is not None and row.get("district_name") != '':
+        district_full = row["district_name"].lower()
+        # dzielenie po '-' i dodanie każdej części osobno
+        # dla kilku dzielnic w apartments.db np ' Pilczyce - Kozanów - Popowice Płn.'
+        district_parts = [part.strip() for part in district_full.split(' - ')]
+        parts.extend(district_parts)
+    
+    return " ".join(parts)
+
+
+def make_document(row):
+    """dokument jednego wiersza - wzorzec dla build_documents (benchmarks/bench_documents.py)"""
+    return lemmatize_text(document_text(row))
+
+
+# ========== DOKUMENTY KOLUMNAMI ==========
+
+# odległości do POI w kolejności jak w make_document
+POI_COLUMNS = [
+    ('schoolDistance', 'szkoła'),
+    ('clinicDistance', 'klinika'),
+    ('kindergartenDistance', 'przedszkole'),
+    ('pharmacyDistance', 'apteka'),
+    ('restaurantDistance', 'restauracja'),
+    ('collegeDistance', 'uczelnia'),
+    ('postOfficeDistance', 'poczta'),
+]
+
+BOOLEAN_TOKENS = [
+    ('hasBalcony', 'balkon'),
+    ('hasElevator', 'winda'),
+    ('hasParkingSpace', 'parking'),
+    ('hasSecurity', 'ochrona'),
+    ('hasStorageRoom', 'piwnica'),
+]
+
+
+def _numeric(frame, col):
+    """kolumna jako float64, NaN tam gdzie brak (także gdy nie ma kolumny - jak row.get)"""
+    if col not in frame.columns:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame[col]).to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _text(frame, col):
+    if col not in frame.columns:
+        return np.full(len(frame), None, dtype=object)
+    return frame[col].to_numpy(dtype=object)
+
+
+def _choose(conditions, labels, default=''):
+    """pierwsza spełniona kategoria w każdym wierszu jako napis po lematyzacji ('' = brak)
+
+    Lematyzacja działa słowo po słowie, a frazy z PHRASES nie przechodzą
+    między etykietami sąsiednich rodzin, więc wystarczy ją zrobić raz dla
+    każdej etykiety zamiast dla każdego dokumentu.
+    """
+    return np.select(conditions, [lemmatize_text(label) for label in labels],
+                     default=lemmatize_text(default)).astype(object)
+
+
+def _equals(values, mapping):
+    return _choose([values == key for key in mapping], list(mapping.values()))
+
+
+def build_documents(frame):
+    """dokumenty dla wszystkich wierszy naraz - wynik taki sam jak apply(make_document, axis=1)
+
+    Każda rodzina kategorii to jedna kolumna tokenów liczona przedziałami na
+    całej kolumnie danych (int() z make_document to np.trunc, NaN nie spełnia
+    żadnego porównania - jak w funkcjach wierszowych).
+    """
+    price = _numeric(frame, 'price')
+    m2 = _numeric(frame, 'squareMeters')
+    rooms = np.trunc(_numeric(frame, 'rooms'))
+    floor = np.trunc(_numeric(frame, 'floor'))
+    floor_count = np.trunc(_numeric(frame, 'floorCount'))
+    centre = _numeric(frame, 'centreDistance')
+    year = np.trunc(_numeric(frame, 'buildYear'))
+
+    columns = [
+        _choose([m2 < 25, m2 < 40, m2 < 55, m2 < 70, m2 < 90],
+                ["bardzo małe kawalerka", "małe", "średnie", "duże", "bardzo duże"],
+                default="ogromne przestronne wielkie"),
+        _choose([price < 490000, price < 600000, price < 1000000],
+                ["tanie okazja przystępne", "tanie", ""],
+                default="luksusowe premium ekskluzywne"),
+        _choose([rooms == 1, rooms == 2, rooms == 3, rooms >= 4],
+                ["kawalerka", "dwupokojowe", "trzypokojowe", "czteropokojowe rodzinne"]),
+        _choose([floor == 0, floor == 1, floor <= 3, floor > 6],
+                ["parter", "pierwsze piętro niskie piętro", "niskie piętro", "wysokie piętro"]),
+        _choose([floor == floor_count], ["ostatnie piętro"]),
+        _choose([np.isnan(floor_count), floor_count <= 2, floor_count <= 5, floor_count <= 10],
+                ["", "niski budynek", "średni budynek", "wysoki budynek"],
+                default="wieżowiec"),
+        _equals(_text(frame, 'type'), {
+            "blockOfFlats": "blok blok mieszkalny",
+            "apartmentBuilding": "apartamentowiec budynek mieszkalny",
+            "tenement": "kamienica",
+        }),
+        _choose([np.isnan(centre), centre < 1, centre < 2, centre < 4, centre < 6],
+                ["", "ścisłe centrum centrum", "blisko_centrum", "niedaleko centrum", "daleko od centrum"],
+                default="bardzo daleko od centrum peryferie"),
+        _choose([np.isnan(year), year >= 2020, year >= 2010, year >= 2000, year >= 1990, year >= 1980, year >= 1960],
+                ["", "nowe nowoczesne świeżo wybudowane", "nowe współczesne", "współczesne", "z lat 90",
+                 "stare PRL", "stare PRL blok z PRL"],
+                default="bardzo stare przedwojenne"),
+        _equals(_text(frame, 'ownership'), {"condominium": "własnościowe", "cooperative": "spółdzielcze"}),
+        _equals(_text(frame, 'condition'), {
+            "premium": "premium luksusowy stan wykończone",
+            "low": "niski stan do remontu do odnowienia",
+        }),
+        _equals(_text(frame, 'buildingMaterial'), {"brick": "cegła ceglany", "concreteSlab": "wielka płyta betonowy"}),
+    ]
+    columns += [_choose([_text(frame, col) == "yes"], [token]) for col, token in BOOLEAN_TOKENS]
+
+    for col, poi_name in POI_COLUMNS:
+        dist = _numeric(frame, col)
+        columns.append(_choose([dist < 0.2, dist < 0.5],
+                               [f"bardzo_blisko_{poi_name}", f"blisko_{poi_name}"]))
+
+    # dzielnica: każda unikalna nazwa rozbita na części i zlematyzowana raz
+    districts = _text(frame, 'district_name')
+    district_tokens = {}
+    for name in pd.unique(districts):
+        if name is not None and name != '':
+            district_tokens[name] = lemmatize_text(' '.join(part.strip() for part in name.lower().split(' - ')))
+    columns.append(np.array([district_tokens.get(name, '') for name in districts], dtype=object))
+
+    # puste napisy to rodziny bez tokenu w danym wierszu
+    return [' '.join(filter(None, tokens)) for tokens in zip(*columns)]
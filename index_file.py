@@ -0,0 +1,208 @@
+import json
+import math
+import mmap
+import os
+from collections import Counter
+
+import numpy as np
+
+# ========== PLIK INDEKSU WYSZUKIWANIA ==========
+
+# Układ pliku: MAGIC, długość nagłówka (uint64 LE), nagłówek JSON, potem
+# tablice numpy jedna za drugą, każda od offsetu wyrównanego do ALIGN.
+# Nagłówek zawiera wersję formatu, sygnaturę pliku bazy, z której zbudowano
+# indeks, i dla każdej tablicy dtype, kształt i offset - aplikacja mapuje plik
+# (mmap) i tworzy tablice bez kopiowania, więc workery gunicorna współdzielą
+# te same strony pamięci.
+
+MAGIC = b'APTSIDX\0'
+FORMAT_VERSION = 1
+ALIGN = 64
+
+INDEX_ARRAYS = [
+    'row_ids',            # rowid dokumentu (rosnąco)
+    'doc_id_offsets',     # id ofert: napisy utf-8 sklejone w doc_id_bytes
+    'doc_id_bytes',
+    'vocab_offsets',      # słownik posortowany jak sorted() w Pythonie
+    'vocab_bytes',
+    'df',                 # liczba dokumentów z tokenem
+    'doc_indptr',         # wektory dokumentów w CSR (tokeny w kolejności z dokumentu)
+    'doc_terms',
+    'doc_weights',
+    'sq_sums',            # suma kwadratów i norma wektora każdego dokumentu
+    'norms',
+    'postings_ptr',       # posting listy: dokumenty rosnąco i wagi dla każdego tokenu
+    'postings_docs',
+    'postings_weights',
+    'max_weights',        # największa waga tokenu (MaxScore)
+]
+
+
+def index_path(db_path):
+    """plik indeksu obok bazy, chyba że SEARCH_INDEX wskazuje inny"""
+    return os.environ.get('SEARCH_INDEX') or f'{db_path}.idx'
+
+
+def db_signature(db_path):
+    """mtime, rozmiar i inode bazy - indeks jest aktualny tylko dla tej samej wersji pliku"""
+    st = os.stat(db_path)
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def _string_table(values):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _read_documents(connection, chunk_rows):
+    last = 0
+    while True:
+        rows = connection.execute(
+            "SELECT rowid, id, document FROM apartments WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last, chunk_rows)).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield rows
+
+
+def build_index_arrays(connection, chunk_rows=10000):
+    """tablice indeksu z dokumentów w bazie; wagi liczone tak samo jak utils.compute_tfidf
+
+    Dwa przejścia partiami po chunk_rows dokumentów (df, potem wagi), więc w
+    pamięci są tylko tablice numpy, a nie słowniki tf-idf dla każdego dokumentu.
+    """
+    df_counts = Counter()
+    row_ids, doc_ids = [], []
+    for rows in _read_documents(connection, chunk_rows):
+        for row_id, doc_id, document in rows:
+            row_ids.append(row_id)
+            doc_ids.append(doc_id or '')
+            df_counts.update(set(document.split()))
+    N = len(row_ids)
+
+    vocabulary = sorted(df_counts)
+    term_ids = {token: i for i, token in enumerate(vocabulary)}
+    # idf przez math.log10 jak w compute_tfidf - wagi identyczne co do bitu
+    idf = np.array([math.log10(N / df_counts[token]) for token in vocabulary], dtype=np.float64)
+
+    lengths, term_chunks, weight_chunks = [], [], []
+    for rows in _read_documents(connection, chunk_rows):
+        chunk_lengths, terms, tfs, max_tfs = [], [], [], []
+        for _, _, document in rows:
+            # Counter zachowuje kolejność pierwszego wystąpienia - tak jak słownik tf-idf dokumentu
+            tf_counts = Counter(document.split())
+            chunk_lengths.append(len(tf_counts))
+            terms.extend(term_ids[token] for token in tf_counts)
+            tfs.extend(tf_counts.values())
+            max_tfs.append(max(tf_counts.values()) if tf_counts else 1)
+        # wagi od razu w tablicach numpy - listy Pythona są tylko dla jednej partii
+        terms = np.array(terms, dtype=np.int32)
+        max_tf = np.repeat(np.array(max_tfs, dtype=np.int64), chunk_lengths)
+        weight_chunks.append((np.array(tfs, dtype=np.int64) / max_tf) * idf[terms])
+        term_chunks.append(terms)
+        lengths.extend(chunk_lengths)
+
+    indptr = np.zeros(N + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    doc_terms = np.concatenate(term_chunks) if term_chunks else np.zeros(0, dtype=np.int32)
+    doc_weights = np.concatenate(weight_chunks) if weight_chunks else np.zeros(0)
+    del term_chunks, weight_chunks
+    doc_rows = np.repeat(np.arange(N, dtype=np.int32), lengths)
+    sq_sums = np.bincount(doc_rows, weights=doc_weights ** 2, minlength=N)
+
+    # posting listy: stabilne sortowanie po tokenie zostawia dokumenty rosnąco
+    order = np.argsort(doc_terms, kind='stable')
+    postings_ptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(doc_terms, minlength=len(vocabulary)), out=postings_ptr[1:])
+    postings_weights = doc_weights[order]
+    max_weights = (np.maximum.reduceat(postings_weights, postings_ptr[:-1])
+                   if len(vocabulary) else np.zeros(0))
+
+    doc_id_offsets, doc_id_bytes = _string_table(doc_ids)
+    vocab_offsets, vocab_bytes = _string_table(vocabulary)
+    return {
+        'row_ids': np.array(row_ids, dtype=np.int64),
+        'doc_id_offsets': doc_id_offsets,
+        'doc_id_bytes': doc_id_bytes,
+        'vocab_offsets': vocab_offsets,
+        'vocab_bytes': vocab_bytes,
+        'df': np.array([df_counts[token] for token in vocabulary], dtype=np.int64),
+        'doc_indptr': indptr,
+        'doc_terms': doc_terms,
+        'doc_weights': doc_weights,
+        'sq_sums': sq_sums,
+        'norms': np.sqrt(sq_sums),
+        'postings_ptr': postings_ptr,
+        'postings_docs': doc_rows[order],
+        'postings_weights': postings_weights,
+        'max_weights': max_weights,
+    }
+
+
+def write_index(arrays, path, signature):
+    """zapis przez plik tymczasowy i os.replace - workery z otwartym mmap zostają przy starym pliku"""
+    layout = {}
+    offset = 0
+    for name in INDEX_ARRAYS:
+        array = np.ascontiguousarray(arrays[name])
+        offset = -(-offset // ALIGN) * ALIGN
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({'format': FORMAT_VERSION, 'db_signature': signature, 'arrays': layout}).encode('utf-8')
+    # dane zaczynają się od pierwszego wyrównanego offsetu za nagłówkiem
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name in INDEX_ARRAYS:
+            f.write(b'\0' * (data_start + layout[name]['offset'] - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name]).tobytes())
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def read_index(path):
+    """(nagłówek, słownik tablic) z pliku indeksu; tablice to widoki tylko do odczytu na mmap
+
+    ValueError przy złym pliku lub innej wersji formatu.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path}: to nie jest plik indeksu')
+    header_len = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], 'little')
+    header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + header_len])
+    if header.get('format') != FORMAT_VERSION:
+        raise ValueError(f"{path}: format {header.get('format')}, oczekiwany {FORMAT_VERSION}")
+
+    data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                     offset=data_start + spec['offset']).reshape(spec['shape'])
+    return header, arrays
+
+
+class StringTable:
+    """napisy z tablic offsetów i bajtów, dekodowane dopiero przy odczycie"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
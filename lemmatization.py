@@ -132,6 +132,101 @@ LEMMAS = {
     'żerniki': 'żerniki',
 }
 
-def lemmatize_text(text):
+# FRAZY WIELOWYRAZOWE - token frazy -> formy (także odmienione), które go dają;
+# słowa form są lematyzowane przez LEMMAS, więc pasuje każda znana odmiana słowa
+PHRASES = {
+    # kategorie z documents.py
+    'wielka_płyta': ['wielka płyta', 'wielkiej płyty', 'wielkiej płycie'],
+    'blok_z_prl': ['blok z PRL', 'bloku z PRL', 'bloki z PRL'],
+    'ścisłe_centrum': ['ścisłe centrum', 'ścisłym centrum', 'ścisłego centrum'],
+    'lata_90': ['z lat 90', 'lata 90', 'latach 90'],
+    'świeżo_wybudowane': ['świeżo wybudowane', 'świeżo wybudowany', 'świeżo wybudowanym'],
+    'do_remontu': ['do remontu'],
+    'do_odnowienia': ['do odnowienia'],
+    'luksusowy_stan': ['luksusowy stan', 'luksusowym stanie'],
+    'niski_stan': ['niski stan', 'niskim stanie'],
+    'niski_budynek': ['niski budynek', 'niskim budynku'],
+    'średni_budynek': ['średni budynek', 'średnim budynku'],
+    'wysoki_budynek': ['wysoki budynek', 'wysokim budynku'],
+    'blok_mieszkalny': ['blok mieszkalny', 'bloku mieszkalnym'],
+    'budynek_mieszkalny': ['budynek mieszkalny', 'budynku mieszkalnym'],
+    'pierwsze_piętro': ['pierwsze piętro', 'pierwszym piętrze'],
+    'niskie_piętro': ['niskie piętro', 'niskim piętrze'],
+    'wysokie_piętro': ['wysokie piętro', 'wysokim piętrze'],
+    'ostatnie_piętro': ['ostatnie piętro', 'ostatnim piętrze'],
+    'niedaleko_centrum': ['niedaleko centrum'],
+    'daleko_od_centrum': ['daleko od centrum'],
+    'bardzo_daleko_od_centrum': ['bardzo daleko od centrum'],
+
+    # dzielnice (części nazw osiedli z GraniceOsiedli.shp)
+    'lipa_piotrowska': ['lipa piotrowska', 'lipie piotrowskiej'],
+    'muchobór_mały': ['muchobór mały', 'muchoborze małym'],
+    'muchobór_wielki': ['muchobór wielki', 'muchoborze wielkim'],
+    'nowy_dwór': ['nowy dwór', 'nowym dworze'],
+    'plac_grunwaldzki': ['plac grunwaldzki', 'placu grunwaldzkim', 'placu grunwaldzkiego'],
+    'powstańców_śląskich': ['powstańców śląskich'],
+    'pracze_odrzańskie': ['pracze odrzańskie', 'praczach odrzańskich'],
+    'przedmieście_oławskie': ['przedmieście oławskie', 'przedmieściu oławskim'],
+    'przedmieście_świdnickie': ['przedmieście świdnickie', 'przedmieściu świdnickim'],
+    'psie_pole': ['psie pole', 'psim polu'],
+    'stare_miasto': ['stare miasto', 'starym mieście', 'starego miasta'],
+    'popowice_północne': ['popowice płn.', 'popowice północne'],
+    'popowice_południowe': ['popowice płd.', 'popowice południowe'],
+}
+
+
+class PhraseLemmatizer:
+    """lematyzacja słowo po słowie i łączenie fraz z PHRASES w jeden token
+
+    Frazy są w drzewie prefiksowym po lematach słów. Tekst jest przechodzony
+    raz: tylko od słów, które zaczynają jakąś frazę, schodzimy w drzewo
+    i wygrywa najdłuższa pasująca fraza, reszta jest kopiowana wycinkami. Wynik jest lematem samego siebie
+    (ponowna lematyzacja nic nie zmienia).
+    """
+
+    def __init__(self, lemmas, phrases):
+        self.lemmas = lemmas
+        # węzeł: lemat słowa -> węzeł, None -> token frazy kończącej się w tym węźle
+        self.root = {}
+        for token, forms in phrases.items():
+            for form in forms:
+                node = self.root
+                for word in form.lower().split():
+                    node = node.setdefault(lemmas.get(word, word), {})
+                node[None] = token
+
+    def __call__(self, text):
+        get = self.lemmas.get
+        lemmas = [get(w, w) for w in text.lower().split()]
+        root = self.root
+        starts = [i for i, lemma in enumerate(lemmas) if lemma in root]
+        if not starts:
+            return ' '.join(lemmas)
+
+        result = []
+        done, n = 0, len(lemmas)
+        for i in starts:
+            if i < done:
+                # słowo w środku już połączonej frazy
+                continue
+            node, j, end = root[lemmas[i]], i, None
+            while node is not None:
+                j += 1
+                if None in node:
+                    token, end = node[None], j
+                node = node.get(lemmas[j]) if j < n else None
+            if end is not None:
+                result.extend(lemmas[done:i])
+                result.append(token)
+                done = end
+        result.extend(lemmas[done:])
+        return ' '.join(result)
+
+
+lemmatize_text = PhraseLemmatizer(LEMMAS, PHRASES)
+
+
+def lemmatize_words(text):
+    """poprzednia wersja: tylko słownik LEMMAS słowo po słowie (benchmarks/bench_lemmatizer.py)"""
     words = text.lower().split()
     return ' '.join([LEMMAS.get(w, w) for w in words])
\ No newline at end of file
@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+from utils import get_read_connection, versioned_cache
+
+# ========== DANE MAPY (GEOJSON + KLASTRY) ==========
+
+# klastry liczone dla zoomów MIN_ZOOM..MAX_CLUSTER_ZOOM, powyżej mapa pokazuje pojedyncze punkty
+MIN_ZOOM = 10
+MAX_CLUSTER_ZOOM = 17
+# kafelek 256 px dzielony na 4x4 komórki, czyli klaster zbiera punkty z ok. 64x64 px
+CELLS_PER_TILE = 4
+# górny limit wyników, które endpoint mapy zwraca na jedno zapytanie
+MAP_MAX_RESULTS = 2000
+# 5 miejsc po przecinku to ok. 1 m - wystarczy do mapy, a GeoJSON jest krótszy
+COORD_DIGITS = 5
+
+
+def cell_keys(lat, lon, zoom):
+    """numer komórki siatki (współrzędne kafelków Web Mercator) dla każdego punktu, -1 = brak położenia"""
+    n = (1 << zoom) * CELLS_PER_TILE
+    with np.errstate(invalid='ignore'):
+        x = np.floor((lon + 180) / 360 * n)
+        lat_rad = np.radians(lat)
+        y = np.floor((1 - np.log(np.tan(lat_rad) + 1 / np.cos(lat_rad)) / math.pi) / 2 * n)
+        keys = x * n + y
+    return np.where(np.isnan(keys), -1, keys).astype(np.int64)
+
+
+class MapGrid:
+    """komórki siatki każdego mieszkania dla każdego zoomu, wiersze w kolejności rowid"""
+
+    def __init__(self, version=None):
+        self.version = version
+        cursor = get_read_connection().cursor()
+        cursor.execute('SELECT rowid, latitude, longitude FROM apartments ORDER BY rowid')
+        rows = cursor.fetchall()
+
+        n = len(rows)
+        self.row_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+        lat = np.fromiter((np.nan if row[1] is None else row[1] for row in rows), dtype=np.float64, count=n)
+        lon = np.fromiter((np.nan if row[2] is None else row[2] for row in rows), dtype=np.float64, count=n)
+        self.cells = {zoom: cell_keys(lat, lon, zoom) for zoom in range(MIN_ZOOM, MAX_CLUSTER_ZOOM + 1)}
+
+    def keys(self, row_ids, zoom):
+        """komórki dla podanych rowid przy danym zoomie"""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        positions = np.searchsorted(self.row_ids, row_ids)
+        found = positions < len(self.row_ids)
+        found[found] = self.row_ids[positions[found]] == row_ids[found]
+
+        keys = np.empty(len(row_ids), dtype=np.int64)
+        keys[found] = self.cells[zoom][positions[found]]
+        # rowid spoza siatki (np. baza zmieniona w trakcie requestu) - każdy punkt we własnej komórce
+        keys[~found] = -2 - np.flatnonzero(~found)
+        return keys
+
+
+@versioned_cache('map_grid')
+def get_map_grid(version):
+    """siatka współdzielona przez requesty, przebudowywana po zmianie bazy"""
+    return MapGrid(version)
+
+
+def _located(results):
+    """wyniki z położeniem, ceną i liczbą pokoi - numer jak na liście wyników"""
+    return [(num, r) for num, r in enumerate(results, start=1)
+            if r.get('latitude') is not None and r.get('longitude') is not None
+            and r.get('price') is not None and r.get('rooms') is not None]
+
+
+def _point_feature(num, result):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(result['longitude'], COORD_DIGITS),
+                                                      round(result['latitude'], COORD_DIGITS)]},
+        'properties': {'num': num, 'id': result.get('id'), 'price': int(result['price']),
+                       'rooms': int(result['rooms'])},
+    }
+
+
+def to_geojson(results):
+    """FeatureCollection z punktami wyników"""
+    return {'type': 'FeatureCollection',
+            'features': [_point_feature(num, r) for num, r in _located(results)]}
+
+
+def _cluster_features(located, zoom, grid, with_points=True):
+    if not located:
+        return []
+    keys = grid.keys([r['row_id'] for _, r in located], zoom)
+    # kolejność klastrów jak pierwsze wystąpienie na liście wyników
+    _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    lat = np.array([r['latitude'] for _, r in located])
+    lon = np.array([r['longitude'] for _, r in located])
+    price = np.array([r['price'] for _, r in located], dtype=np.float64)
+    lat_sum = np.bincount(inverse, weights=lat)
+    lon_sum = np.bincount(inverse, weights=lon)
+    price_sum = np.bincount(inverse, weights=price)
+
+    features = []
+    for c in np.argsort(first, kind='stable'):
+        if counts[c] == 1:
+            if with_points:
+                features.append(_point_feature(*located[first[c]]))
+            continue
+        members = inverse == c
+        feature = {
+            'type': 'Feature',
+            'bbox': [round(float(lon[members].min()), COORD_DIGITS), round(float(lat[members].min()), COORD_DIGITS),
+                     round(float(lon[members].max()), COORD_DIGITS), round(float(lat[members].max()), COORD_DIGITS)],
+            'geometry': {'type': 'Point', 'coordinates': [round(float(lon_sum[c] / counts[c]), COORD_DIGITS),
+                                                          round(float(lat_sum[c] / counts[c]), COORD_DIGITS)]},
+            'properties': {'count': int(counts[c]), 'avg_price': int(price_sum[c] / counts[c])},
+        }
+        if not with_points:
+            # numery punktów w klastrze - mapa ukrywa je zamiast dostawać kopie punktów na każdy zoom
+            feature['properties']['nums'] = [located[i][0] for i in np.flatnonzero(members)]
+        features.append(feature)
+    return features
+
+
+def cluster_geojson(results, zoom):
+    """FeatureCollection z klastrami wyników dla jednego zoomu (pojedyncze punkty bez zmian)"""
+    if zoom is None or zoom > MAX_CLUSTER_ZOOM:
+        return to_geojson(results)
+    zoom = max(zoom, MIN_ZOOM)
+    return {'type': 'FeatureCollection',
+            'features': _cluster_features(_located(results), zoom, get_map_grid())}
+
+
+def all_zooms_geojson(results):
+    """punkty raz i same klastry (z numerami punktów) dla każdego zoomu - mapa przełącza je bez kolejnych zapytań"""
+    located = _located(results)
+    grid = get_map_grid()
+    return {
+        'min_zoom': MIN_ZOOM,
+        'max_cluster_zoom': MAX_CLUSTER_ZOOM,
+        'points': {'type': 'FeatureCollection', 'features': [_point_feature(num, r) for num, r in located]},
+        'clusters': {zoom: {'type': 'FeatureCollection',
+                            'features': _cluster_features(located, zoom, grid, with_points=False)}
+                     for zoom in range(MIN_ZOOM, MAX_CLUSTER_ZOOM + 1)},
+    }
@@ -0,0 +1,163 @@
+import sqlite3
+
+import numpy as np
+
+# ========== STATYSTYKI RYNKU (MATERIALIZOWANE) ==========
+
+# zakres '*' to cały Wrocław, pozostałe wiersze to dzielnice (district_name)
+ALL_SCOPE = '*'
+
+PERCENTILES = (25, 50, 75)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS market_stats (
+    scope TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum_price REAL NOT NULL DEFAULT 0,
+    sum_sqm REAL NOT NULL DEFAULT 0,
+    price_p25 REAL,
+    price_median REAL,
+    price_p75 REAL,
+    price_per_sqm_p25 REAL,
+    price_per_sqm_median REAL,
+    price_per_sqm_p75 REAL,
+    stale INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# liczniki i sumy są aktualizowane od razu przez triggery, percentyle
+# zakresu dostają flagę stale i są przeliczane w refresh_market_stats
+_ADD = """
+    INSERT INTO market_stats (scope, count, sum_price, sum_sqm, stale)
+    SELECT {scope}, 1, COALESCE({row}.price, 0), COALESCE({row}.squareMeters, 0), 1
+    WHERE {scope} IS NOT NULL
+    ON CONFLICT(scope) DO UPDATE SET
+        count = count + 1,
+        sum_price = sum_price + excluded.sum_price,
+        sum_sqm = sum_sqm + excluded.sum_sqm,
+        stale = 1;
+"""
+
+_REMOVE = """
+    UPDATE market_stats SET
+        count = count - 1,
+        sum_price = sum_price - COALESCE({row}.price, 0),
+        sum_sqm = sum_sqm - COALESCE({row}.squareMeters, 0),
+        stale = 1
+    WHERE scope = {scope};
+"""
+
+
+def _trigger_body(template, row):
+    return (template.format(scope=f"'{ALL_SCOPE}'", row=row)
+            + template.format(scope=f"{row}.district_name", row=row))
+
+
+TRIGGERS = {
+    'market_stats_insert': 'AFTER INSERT ON apartments BEGIN' + _trigger_body(_ADD, 'NEW') + 'END',
+    'market_stats_delete': 'AFTER DELETE ON apartments BEGIN' + _trigger_body(_REMOVE, 'OLD') + 'END',
+    'market_stats_update': ('AFTER UPDATE OF price, squareMeters, district_name ON apartments BEGIN'
+                            + _trigger_body(_REMOVE, 'OLD') + _trigger_body(_ADD, 'NEW') + 'END'),
+}
+
+
+def create_market_stats(connection):
+    """tabela statystyk policzona od zera + triggery utrzymujące ją przy zmianach w apartments"""
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS market_stats")
+    cursor.execute(SCHEMA)
+    cursor.execute(f"""
+        INSERT INTO market_stats (scope, count, sum_price, sum_sqm, stale)
+        SELECT '{ALL_SCOPE}', COUNT(*), COALESCE(SUM(price), 0), COALESCE(SUM(squareMeters), 0), 1
+        FROM apartments
+    """)
+    cursor.execute("""
+        INSERT INTO market_stats (scope, count, sum_price, sum_sqm, stale)
+        SELECT district_name, COUNT(*), COALESCE(SUM(price), 0), COALESCE(SUM(squareMeters), 0), 1
+        FROM apartments
+        WHERE district_name IS NOT NULL
+        GROUP BY district_name
+    """)
+    for name, body in TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {body}")
+    refresh_market_stats(connection)
+
+
+def _percentiles(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return [None] * len(PERCENTILES)
+    return [float(v) for v in np.percentile(values, PERCENTILES)]
+
+
+def refresh_market_stats(connection):
+    """przelicza od nowa tylko zakresy oznaczone jako stale (sumy i percentyle)"""
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM market_stats WHERE count <= 0 AND scope != ?", (ALL_SCOPE,))
+    cursor.execute("SELECT scope FROM market_stats WHERE stale = 1")
+    scopes = [row[0] for row in cursor.fetchall()]
+
+    for scope in scopes:
+        if scope == ALL_SCOPE:
+            cursor.execute("SELECT price, squareMeters FROM apartments")
+        else:
+            cursor.execute("SELECT price, squareMeters FROM apartments WHERE district_name = ?", (scope,))
+        # prosto z kursora do tablicy, bez listy krotek z całym zakresem
+        values = np.fromiter(((np.nan if r[0] is None else r[0], np.nan if r[1] is None else r[1]) for r in cursor),
+                             dtype=[('price', np.float64), ('sqm', np.float64)])
+        prices, sqms = values['price'], values['sqm']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_sqm = np.where(sqms > 0, prices / sqms, np.nan)
+
+        cursor.execute("""
+            UPDATE market_stats SET
+                count = ?, sum_price = ?, sum_sqm = ?,
+                price_p25 = ?, price_median = ?, price_p75 = ?,
+                price_per_sqm_p25 = ?, price_per_sqm_median = ?, price_per_sqm_p75 = ?,
+                stale = 0
+            WHERE scope = ?
+        """, [len(values), float(np.nansum(prices)), float(np.nansum(sqms))]
+             + _percentiles(prices) + _percentiles(per_sqm) + [scope])
+    connection.commit()
+    return scopes
+
+
+def _row_to_stats(row):
+    count = row['count']
+    return {
+        'total_count': count,
+        'avg_price': row['sum_price'] / count if count else 0,
+        'avg_sqm': row['sum_sqm'] / count if count else 0,
+        'avg_price_per_sqm': row['sum_price'] / row['sum_sqm'] if row['sum_sqm'] > 0 else 0,
+        'price_p25': row['price_p25'],
+        'price_median': row['price_median'],
+        'price_p75': row['price_p75'],
+        'price_per_sqm_p25': row['price_per_sqm_p25'],
+        'price_per_sqm_median': row['price_per_sqm_median'],
+        'price_per_sqm_p75': row['price_per_sqm_p75'],
+    }
+
+
+def read_market_stats(connection, scope=ALL_SCOPE):
+    """statystyki jednego zakresu (odczyt po kluczu) albo None, gdy brak tabeli lub zakresu"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT * FROM market_stats WHERE scope = ?", (scope,))
+    except sqlite3.OperationalError:
+        return None
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return _row_to_stats(row)
+
+
+def read_district_stats(connection):
+    """statystyki wszystkich dzielnic, posortowane po nazwie"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT * FROM market_stats WHERE scope != ? AND count > 0 ORDER BY scope",
+                       (ALL_SCOPE,))
+    except sqlite3.OperationalError:
+        return []
+    return [dict(_row_to_stats(row), district_name=row['scope']) for row in cursor.fetchall()]
@@ -0,0 +1,180 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ========== METRYKI (PROMETHEUS) ==========
+
+# Histogramy i liczniki w pamięci procesu, eksport w formacie tekstowym
+# Prometheusa (/metrics). Pomiar to bisect i inkrementacja pod blokadą
+# jednej metryki; /metrics tylko kopiuje liczniki pod blokadą i formatuje
+# tekst poza nią, więc częste scrapowanie nie wstrzymuje requestów.
+
+PREFIX = 'apartments_'
+
+# sekundy
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# liczba dokumentów
+COUNT_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    """histogram z kubełkami le, osobno dla każdej wartości etykiety"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label=None):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        names = (self.label,) if self.label else ()
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, counts, total in sorted(snapshot, key=lambda s: str(s[0])):
+            values = (key,) if self.label else ()
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(names + ("le",), values + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(names, values)} {total}')
+            lines.append(f'{self.name}_count{_labels(names, values)} {cumulative}')
+        return lines
+
+
+class Counter:
+    """licznik z etykietami (krotka wartości w kolejności labels)"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for values, count in sorted(self.snapshot().items()):
+            lines.append(f'{self.name}{_labels(self.labels, values)} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('request_duration_seconds', 'Czas obsługi requestu (bez strumieniowanej treści).',
+                            label='endpoint')
+STAGE_SECONDS = Histogram('stage_duration_seconds', 'Czas etapu requestu.', label='stage')
+DOCUMENTS_SCORED = Histogram('documents_scored', 'Dokumenty, dla których liczono wynik tf-idf, na zapytanie.',
+                             buckets=COUNT_BUCKETS)
+CACHE_REQUESTS = Counter('cache_requests_total', 'Odczyty cache według wyniku.', labels=('cache', 'result'))
+DEGRADED_PANELS = Counter('degraded_panels_total', 'Panele strony pominięte po przekroczeniu czasu albo błędzie.',
+                          labels=('stage',))
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, DOCUMENTS_SCORED, CACHE_REQUESTS, DEGRADED_PANELS]
+
+
+def cache_access(cache, hit):
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), count in CACHE_REQUESTS.snapshot().items():
+        hits, all_requests = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (count if result == 'hit' else 0), all_requests + count)
+    name = PREFIX + 'cache_hit_ratio'
+    lines = [f'# HELP {name} Udział trafień w cache od startu procesu.', f'# TYPE {name} gauge']
+    for cache, (hits, all_requests) in sorted(totals.items()):
+        lines.append(f'{name}{_labels(("cache",), (cache,))} {hits / all_requests}')
+    return lines
+
+
+def render():
+    """wszystkie metryki w formacie tekstowym Prometheusa"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _cache_hit_ratios()
+    return '\n'.join(lines) + '\n'
+
+
+# ========== POMIARY REQUESTU (SERVER-TIMING) ==========
+
+class RequestTimings:
+    """czasy etapów jednego requestu - nagłówek Server-Timing"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.entries = []
+
+    def add(self, name, seconds):
+        # list.append jest atomowe - etapy z wątków puli dopisują się bez blokady
+        self.entries.append((name, seconds))
+
+    def header(self, total):
+        durations = {}
+        for name, seconds in list(self.entries):
+            durations[name] = durations.get(name, 0.0) + seconds
+        durations['total'] = total
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in durations.items())
+
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request():
+    _current.set(RequestTimings())
+
+
+def finish_request(endpoint):
+    """zapis czasu requestu do histogramu i wartość nagłówka Server-Timing (None poza requestem)"""
+    timings = _current.get()
+    if timings is None:
+        return None
+    _current.set(None)
+    total = time.perf_counter() - timings.start
+    REQUEST_SECONDS.observe(total, endpoint or 'unknown')
+    return timings.header(total)
+
+
+def record(name, seconds):
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """czas bloku jako etap name: histogram i wpis Server-Timing bieżącego requestu"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
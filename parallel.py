@@ -0,0 +1,32 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# ========== PULA PROCESÓW DLA DATA_PREP ==========
+
+
+def ordered_map(fn, items, workers=1, initializer=None, initargs=()):
+    """pary (item, fn(item)) w kolejności items, fn liczone w puli workers procesów
+
+    Wyniki są oddawane w kolejności wejścia, więc zapis do bazy jest taki sam
+    jak w trybie szeregowym. W locie jest najwyżej 2 * workers partii, żeby
+    pamięć nie rosła z rozmiarem tabeli. workers=1 - bez puli, w tym procesie
+    (initializer też jest wywoływany tutaj). fn i initializer muszą być
+    funkcjami z poziomu modułu (pickle).
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield item, fn(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for item in items:
+            pending.append((item, pool.submit(fn, item)))
+            if len(pending) >= 2 * workers:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
@@ -0,0 +1,229 @@
+import cProfile
+import contextvars
+import functools
+import glob
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+
+# ========== PROFILOWANIE POJEDYNCZYCH REQUESTÓW ==========
+
+# Profil cProfile jednego requestu na żądanie (nagłówek X-Profile albo
+# parametr profile=1, gdy aplikacja ma włączone PROFILE_REQUESTS), zapisywany
+# jako plik .prof (pstats, snakeviz). Obok zapisywane są .json z zapytaniem
+# i filtrami oraz .txt z najdroższymi funkcjami. Request bez profilu płaci
+# tylko za odczyt zmiennej kontekstu.
+#
+# Python 3.11: cProfile mierzy tylko wątek, w którym jest włączony, więc
+# widok, każdy etap z puli wątków (stages.run_stage) i strumieniowana treść
+# odpowiedzi mają własne profile, sklejane na końcu requestu.
+# Python 3.12+: cProfile działa na sys.monitoring - w procesie może być
+# włączony tylko jeden profiler (kolejny enable() rzuca ValueError) i mierzy
+# on wszystkie wątki. Request ma wtedy jeden profil od start() do save(), a
+# w pliku są też wątki innych requestów obsługiwanych w tym samym czasie.
+#
+# W obu wersjach profilowany jest najwyżej jeden request naraz w procesie -
+# kolejne prośby o profil w tym czasie są obsługiwane bez profilu.
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+# funkcji w podsumowaniu tekstowym
+SUMMARY_LINES = 40
+# osobny profiler w każdym wątku (do 3.11) albo jeden na cały proces (3.12+)
+PER_THREAD = sys.version_info < (3, 12)
+
+logger = logging.getLogger(__name__)
+_active = threading.Lock()
+
+
+def _enable():
+    """włączony cProfile.Profile albo None, gdy profilera nie da się włączyć"""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # sys.monitoring zajęte przez inne narzędzie (debugger, coverage) - bez profilu
+        logger.warning('profilowanie niedostępne - aktywne inne narzędzie profilujące')
+        return None
+    return profile
+
+
+class RequestProfile:
+    """profile cProfile z wątków jednego requestu i jego metadane"""
+
+    def __init__(self, meta):
+        self.meta = meta
+        self.start = time.perf_counter()
+        # nazwy rosną z czasem - sortowanie po nazwie to kolejność requestów
+        self.name = f"{time.time_ns()}-{meta.get('endpoint') or 'request'}-{os.getpid()}"
+        self.profiles = []
+        self.saved = False
+        # profiler całego requestu (3.12+), do wyłączenia w finish()
+        self.profile = None
+        self._finished = False
+
+    def add(self, profile):
+        # etap po przekroczeniu limitu czasu kończy się w tle już po save() - jego profil
+        # jest pomijany, więc w pliku brakuje tej części (pozostaje czas etapu w Server-Timing)
+        if not self.saved:
+            self.profiles.append(profile)
+
+    def call(self, fn, *args, **kwargs):
+        """fn we własnym profilu wątku (3.11); od 3.12 mierzy je profiler requestu"""
+        profile = _enable() if PER_THREAD else None
+        if profile is None:
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            # także po wyjątku - etap z błędem zostaje w profilu
+            self.add(profile)
+
+    def finish(self):
+        """koniec pomiaru: wyłącza profiler requestu i zwalnia miejsce dla następnego (raz)"""
+        if self._finished:
+            return
+        self._finished = True
+        self.saved = True
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiles.append(self.profile)
+        _active.release()
+
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def requested(headers, args):
+    """czy request prosi o profil (nagłówek albo parametr)"""
+    value = headers.get(PROFILE_HEADER) or args.get(PROFILE_PARAM)
+    return value not in (None, '', '0', 'false')
+
+
+def start(meta):
+    """profil bieżącego requestu albo None, gdy w procesie trwa już inny profil"""
+    if not _active.acquire(blocking=False):
+        logger.info('profil pominięty - inny request jest właśnie profilowany')
+        return None
+    request_profile = RequestProfile(meta)
+    if not PER_THREAD:
+        # jeden profiler na cały request - widok, etapy, wykresy i strumieniowaną treść
+        request_profile.profile = _enable()
+        if request_profile.profile is None:
+            _active.release()
+            return None
+    _current.set(request_profile)
+    return request_profile
+
+
+def stop():
+    """profil bieżącego requestu (albo None) - kolejne wywołania w tym kontekście nie są już mierzone"""
+    request_profile = _current.get()
+    if request_profile is not None:
+        _current.set(None)
+    return request_profile
+
+
+def wrap(fn):
+    """fn mierzone we własnym profilu bieżącego requestu, gdy jest aktywny (dla wątków etapów)"""
+    request_profile = _current.get()
+    if request_profile is None or not PER_THREAD:
+        return fn
+    return functools.partial(request_profile.call, fn)
+
+
+def profiled(view):
+    """widok mierzony, gdy request ma aktywny profil; inaczej wywołanie bez zmian"""
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_view(*args, **kwargs):
+            request_profile = _current.get()
+            profile = _enable() if request_profile is not None and PER_THREAD else None
+            if profile is None:
+                return await view(*args, **kwargs)
+            # włączony w wątku pętli zdarzeń, który wykonuje korutynę widoku
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                profile.disable()
+                request_profile.add(profile)
+        return async_view
+
+    @functools.wraps(view)
+    def sync_view(*args, **kwargs):
+        request_profile = _current.get()
+        if request_profile is None:
+            return view(*args, **kwargs)
+        return request_profile.call(view, *args, **kwargs)
+    return sync_view
+
+
+def profile_iterable(request_profile, iterable):
+    """iterable treści odpowiedzi mierzone kawałek po kawałku (strumieniowanie po after_request)"""
+    if not PER_THREAD:
+        # profiler requestu działa aż do save() po zamknięciu odpowiedzi
+        return iterable
+    return _profiled_chunks(request_profile, iterable)
+
+
+def _profiled_chunks(request_profile, iterable):
+    profile = cProfile.Profile()
+    iterator = iter(iterable)
+    try:
+        while True:
+            profile.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                profile.disable()
+            yield chunk
+    finally:
+        request_profile.add(profile)
+
+
+def save(request_profile, directory, keep, **extra):
+    """zapis profilu (.prof, .json, .txt) w directory i rotacja do keep najnowszych"""
+    request_profile.finish()
+    profiles = list(request_profile.profiles)
+    if not profiles:
+        return
+    meta = {**request_profile.meta, **extra,
+            'duration_s': round(time.perf_counter() - request_profile.start, 4),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'pid': os.getpid(),
+            'all_threads': not PER_THREAD}
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, request_profile.name)
+    stats.dump_stats(base + '.prof')
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    summary = io.StringIO()
+    stats.stream = summary
+    stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write(summary.getvalue())
+    rotate(directory, keep)
+
+
+def rotate(directory, keep):
+    """zostawia keep najnowszych profili (razem z ich .json i .txt)"""
+    profiles = sorted(glob.glob(os.path.join(directory, '*.prof')))
+    for path in profiles[:max(len(profiles) - keep, 0)]:
+        base = path[:-len('.prof')]
+        for suffix in ('.prof', '.json', '.txt'):
+            try:
+                os.remove(base + suffix)
+            except FileNotFoundError:
+                pass
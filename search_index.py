@@ -0,0 +1,418 @@
+import heapq
+import math
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+import utils
+from index_file import StringTable, db_signature, index_path, read_index
+from utils import compile_query, compute_tfidf, load_documents_cached, versioned_cache
+
+# ========== MODEL TF-IDF ==========
+
+# skompilowanych zapytań trzymanych w modelu (wektor zależy od df i N, więc cache jest per model)
+QUERY_CACHE_SIZE = 512
+
+
+class TfidfModel:
+    """wektory tf-idf, słownik, df i N zbudowane raz dla danej wersji bazy"""
+
+    def __init__(self, row_ids, doc_ids, documents, version=None):
+        self.version = version
+        self.row_ids = row_ids
+        self.doc_ids = doc_ids
+        # słowniki tf-idf tylko do zbudowania postingów i macierzy CSR - model ich nie trzyma
+        tfidf_docs, _, self.df_counts, self.N = compute_tfidf(documents)
+        self.vocabulary = sorted(self.df_counts)
+        self.rowid_to_idx = {row_id: idx for idx, row_id in enumerate(row_ids)}
+        self.index = InvertedIndex(tfidf_docs)
+        self.similarity = SimilarityEngine(tfidf_docs, self.vocabulary)
+        self._init_query_cache()
+
+    def _init_query_cache(self):
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+
+    def compile_query(self, query):
+        """CompiledQuery dla tekstu zapytania, popularne zapytania z LRU"""
+        # lematyzacja i tak zamienia na małe litery i dzieli po białych znakach
+        key = ' '.join(query.lower().split())
+        with self._query_cache_lock:
+            compiled = self._query_cache.get(key)
+            if compiled is not None:
+                self._query_cache.move_to_end(key)
+        metrics.cache_access('query', compiled is not None)
+        if compiled is not None:
+            return compiled
+
+        compiled = compile_query(query, self.df_counts, self.N)
+        with self._query_cache_lock:
+            self._query_cache[key] = compiled
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return compiled
+
+    def candidates(self, row_ids):
+        """zbiór indeksów dokumentów dla rowid z filtrów (None = bez ograniczeń)"""
+        if row_ids is None:
+            return None
+        return {self.rowid_to_idx[r] for r in row_ids if r in self.rowid_to_idx}
+
+
+# ========== INDEKS ODWROTNY ==========
+
+# względny margines na błędy zaokrągleń przy porównaniach z progiem
+_EPS = 1e-9
+# postingi zapytania (suma długości) od tego ułamka N - wszystkie wyniki naraz w numpy zamiast
+# MaxScore: gęsty bincount po N dokumentach jest wtedy tańszy niż pętla Pythona po postingach
+BROAD_COVERAGE = 0.1
+
+
+def _top_scored(hits, scores, k):
+    """k najlepszych doc_idx z hits (wyniki w scores) - malejąco, przy remisie mniejszy doc_idx"""
+    if len(hits) > k:
+        # próg k-tego wyniku, remisy z progiem zostają do sortowania po doc_idx
+        kth = np.partition(scores, len(hits) - k)[len(hits) - k]
+        keep = scores >= kth
+        hits, scores = hits[keep], scores[keep]
+    order = np.lexsort((hits, -scores))
+    return hits[order[:k]].tolist()
+
+
+class InvertedIndex:
+    """token -> posting lista (doc_idx rosnąco, waga tf-idf)
+
+    Postingi są też sklejone w tablice numpy (ptr, docs, weights) dla
+    zapytań, które dotykają dużej części korpusu.
+    """
+
+    def __init__(self, tfidf_docs):
+        self.N = len(tfidf_docs)
+        self.postings = {}
+        for idx, doc_tfidf in enumerate(tfidf_docs):
+            for token, weight in doc_tfidf.items():
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = self.postings[token] = ([], [])
+                posting[0].append(idx)
+                posting[1].append(weight)
+        # górne ograniczenie wkładu termu do wyniku dokumentu (MaxScore)
+        self.max_weights = {token: max(weights) for token, (_, weights) in self.postings.items()}
+
+        self.term_ids = {token: i for i, token in enumerate(self.postings)}
+        self.ptr = np.zeros(len(self.postings) + 1, dtype=np.int64)
+        np.cumsum([len(docs) for docs, _ in self.postings.values()], out=self.ptr[1:])
+        self.docs = np.fromiter((idx for docs, _ in self.postings.values() for idx in docs),
+                                dtype=np.int32, count=self.ptr[-1])
+        self.weights = np.fromiter((w for _, weights in self.postings.values() for w in weights),
+                                   dtype=np.float64, count=self.ptr[-1])
+
+    def weight(self, token, idx):
+        docs, weights = self.postings.get(token, ((), ()))
+        pos = bisect_left(docs, idx)
+        if pos < len(docs) and docs[pos] == idx:
+            return weights[pos]
+        return 0
+
+    def score(self, query_tokens):
+        """suma tf-idf po tokenach zapytania, tylko dla dokumentów z postingów"""
+        scores = {}
+        # kolejność sumowania jak w baseline.search_tfidf, więc wyniki są identyczne co do bitu
+        for token in query_tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            for idx, weight in zip(*posting):
+                scores[idx] = scores.get(idx, 0) + weight
+        return scores
+
+    def top_k(self, query_tokens, k, candidates=None):
+        """k najlepszych dokumentów; candidates - zbiór doc_idx z filtrów
+
+        Wybór metody po liczbie postingów zapytania: mało kandydatów - wyniki
+        tylko dla nich, postingi pokrywające dużą część korpusu - wszystkie
+        wyniki naraz (exhaustive_top_k), w pozostałych przypadkach MaxScore.
+        """
+        terms = [t for t in query_tokens if t in self.postings]
+        if not terms or k <= 0:
+            return []
+
+        touched = sum(len(self.postings[t][0]) for t in terms)
+        if candidates is not None and len(candidates) < touched:
+            # mniej kandydatów niż postingów - liczymy ich wyniki bezpośrednio
+            scored = [(idx, sum(self.weight(token, idx) for token in terms)) for idx in candidates]
+            metrics.DOCUMENTS_SCORED.observe(len(candidates))
+            top = heapq.nsmallest(k, (x for x in scored if x[1] > 0), key=lambda x: (-x[1], x[0]))
+            return [idx for idx, _ in top]
+        if touched >= BROAD_COVERAGE * self.N:
+            return self.exhaustive_top_k(terms, k, candidates)
+        return self.maxscore_top_k(terms, k, candidates)
+
+    def exhaustive_top_k(self, query_tokens, k, candidates=None):
+        """wyniki wszystkich dokumentów z postingów (bincount) i wybór k najlepszych
+
+        bincount dodaje wagi w kolejności tokenów zapytania, więc sumy są
+        identyczne co do bitu jak w score i baseline.search_tfidf.
+        """
+        term_ids = [self.term_ids[t] for t in query_tokens if t in self.term_ids]
+        if not term_ids or k <= 0:
+            return []
+        docs = np.concatenate([self.docs[self.ptr[i]:self.ptr[i + 1]] for i in term_ids])
+        weights = np.concatenate([self.weights[self.ptr[i]:self.ptr[i + 1]] for i in term_ids])
+        scores = np.bincount(docs, weights=weights, minlength=self.N)
+        hits = np.flatnonzero(scores > 0)
+        if candidates is not None:
+            allowed = np.zeros(self.N, dtype=bool)
+            allowed[np.fromiter(candidates, dtype=np.int64, count=len(candidates))] = True
+            hits = hits[allowed[hits]]
+        metrics.DOCUMENTS_SCORED.observe(len(hits))
+        return _top_scored(hits, scores[hits], k)
+
+    def maxscore_top_k(self, query_tokens, k, candidates=None):
+        """k najlepszych dokumentów bez liczenia i sortowania wszystkich trafień
+
+        Termy idą od największej maksymalnej wagi. Gdy suma maksymalnych wag
+        pozostałych termów spadnie poniżej k-tego wyniku, nowe dokumenty nie
+        mają już szans na top-k - dalej aktualizujemy tylko kandydatów.
+        candidates (zbiór doc_idx z filtrów) zawęża dokumenty już przy
+        przechodzeniu postingów.
+        """
+        terms = [t for t in query_tokens if t in self.postings]
+        if not terms or k <= 0:
+            return []
+
+        postings = {t: self.postings[t] for t in terms}
+        if candidates is not None:
+            for t, (docs, weights) in postings.items():
+                kept = [(idx, w) for idx, w in zip(docs, weights) if idx in candidates]
+                postings[t] = ([idx for idx, _ in kept], [w for _, w in kept])
+
+        order = sorted(range(len(terms)), key=lambda i: -self.max_weights[terms[i]])
+        remaining = [0.0] * (len(order) + 1)
+        for step in range(len(order) - 1, -1, -1):
+            remaining[step] = remaining[step + 1] + self.max_weights[terms[order[step]]]
+
+        acc = {}
+        theta = 0.0
+        # dokumenty z akumulatorem - nowe dochodzą tylko przy pełnym przejściu postingu
+        scored = 0
+        for step, i in enumerate(order):
+            docs, weights = postings[terms[i]]
+            if len(acc) >= k:
+                theta = heapq.nlargest(k, acc.values())[-1] * (1 - _EPS)
+
+            if theta <= 0 or remaining[step] * (1 + _EPS) >= theta:
+                for idx, weight in zip(docs, weights):
+                    acc[idx] = acc.get(idx, 0) + weight
+                scored = max(scored, len(acc))
+                continue
+
+            # odrzucamy kandydatów, którzy nawet z maksymalnymi wagami nie dogonią progu
+            acc = {idx: s for idx, s in acc.items() if (s + remaining[step]) * (1 + _EPS) >= theta}
+            if len(acc) * 8 < len(docs):
+                for idx in acc:
+                    pos = bisect_left(docs, idx)
+                    if pos < len(docs) and docs[pos] == idx:
+                        acc[idx] += weights[pos]
+            else:
+                for idx, weight in zip(docs, weights):
+                    if idx in acc:
+                        acc[idx] += weight
+
+        metrics.DOCUMENTS_SCORED.observe(scored)
+        if not acc:
+            return []
+        top = heapq.nlargest(k, acc.values())
+        theta = top[-1] * (1 - _EPS)
+        candidates = [idx for idx, s in acc.items() if s > 0 and s >= theta]
+
+        if order != sorted(order):
+            # wyniki sumowane w innej kolejności niż w baseline.search_tfidf - dla
+            # kandydatów liczymy je jeszcze raz w kolejności z zapytania
+            exact = {idx: sum(self.weight(token, idx) for token in terms) for idx in candidates}
+        else:
+            exact = acc
+        return heapq.nsmallest(k, candidates, key=lambda idx: (-exact[idx], idx))
+
+    def search(self, query, top_n=25, candidates=None):
+        """query - CompiledQuery (TfidfModel.compile_query)"""
+        return self.top_k(query.tokens, top_n, candidates)
+
+
+# ========== MIARY PODOBIEŃSTWA (NUMPY) ==========
+
+class SimilarityEngine:
+    """macierz dokumentów w formacie CSR z policzonymi normami i sumami kwadratów
+
+    Cosine, Jaccard i Dice dla całej paczki kandydatów w jednym przebiegu,
+    wzory jak w benchmarks/baseline.py (cosine_similarity / jaccard_similarity / dice_similarity).
+    """
+
+    def __init__(self, tfidf_docs, vocabulary):
+        self.term_ids = {token: i for i, token in enumerate(vocabulary)}
+        nnz = sum(len(doc_tfidf) for doc_tfidf in tfidf_docs)
+
+        self.indptr = np.zeros(len(tfidf_docs) + 1, dtype=np.int64)
+        np.cumsum([len(doc_tfidf) for doc_tfidf in tfidf_docs], out=self.indptr[1:])
+        self.indices = np.fromiter((self.term_ids[t] for doc_tfidf in tfidf_docs for t in doc_tfidf),
+                                   dtype=np.int32, count=nnz)
+        self.data = np.fromiter((w for doc_tfidf in tfidf_docs for w in doc_tfidf.values()),
+                                dtype=np.float64, count=nnz)
+
+        rows = np.repeat(np.arange(len(tfidf_docs)), np.diff(self.indptr))
+        self.sq_sums = np.bincount(rows, weights=self.data ** 2, minlength=len(tfidf_docs))
+        self.norms = np.sqrt(self.sq_sums)
+
+    @classmethod
+    def from_arrays(cls, vocabulary, indptr, indices, data, sq_sums, norms):
+        """silnik na gotowych tablicach CSR (np. z pliku indeksu), bez budowania z tfidf_docs"""
+        engine = cls.__new__(cls)
+        engine.term_ids = {token: i for i, token in enumerate(vocabulary)}
+        engine.indptr, engine.indices, engine.data = indptr, indices, data
+        engine.sq_sums, engine.norms = sq_sums, norms
+        return engine
+
+    def dot(self, query, doc_indices):
+        q = np.zeros(len(self.term_ids))
+        for token, weight in query.tfidf.items():
+            term_id = self.term_ids.get(token)
+            if term_id is not None:
+                q[term_id] = weight
+
+        starts = self.indptr[doc_indices]
+        lengths = self.indptr[doc_indices + 1] - starts
+        # pozycje wszystkich niezerowych elementów wybranych wierszy
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(lengths.sum())
+        products = self.data[positions] * q[self.indices[positions]]
+        rows = np.repeat(np.arange(len(doc_indices)), lengths)
+        return np.bincount(rows, weights=products, minlength=len(doc_indices))
+
+    def scores(self, query, doc_indices):
+        """słownik miara -> tablica wyników w kolejności doc_indices (query - CompiledQuery)"""
+        doc_indices = np.asarray(doc_indices, dtype=np.int64)
+        dot = self.dot(query, doc_indices)
+        q_sq = query.sq_sum
+        sq = self.sq_sums[doc_indices]
+
+        def safe_div(num, den):
+            return np.divide(num, den, out=np.zeros(len(doc_indices)), where=den > 0)
+
+        return {
+            'cosine': safe_div(dot, math.sqrt(q_sq) * self.norms[doc_indices]),
+            'jaccard': safe_div(dot, q_sq + sq - dot),
+            'dice': safe_div(2 * dot, q_sq * sq),
+        }
+
+
+# ========== INDEKS Z PLIKU (MMAP) ==========
+
+class MappedIndex:
+    """posting listy z pliku indeksu - tablice numpy w mmap zamiast list Pythona
+
+    Wyniki są liczone wektorowo dla dokumentów z postingów zapytania (po
+    filtrach): bincount dodaje wagi w kolejności tokenów zapytania, więc sumy
+    są identyczne co do bitu jak w baseline.search_tfidf. Tablica na cały
+    korpus tylko dla szerokich zapytań (BROAD_COVERAGE). Ranking jak w
+    InvertedIndex.top_k - wynik malejąco, przy remisie mniejszy doc_idx.
+    """
+
+    def __init__(self, vocabulary, ptr, docs, weights, max_weights, N):
+        self.term_ids = {token: i for i, token in enumerate(vocabulary)}
+        self.ptr = ptr
+        self.docs = docs
+        self.weights = weights
+        self.max_weights = max_weights
+        self.N = N
+
+    def posting(self, token):
+        term_id = self.term_ids.get(token)
+        if term_id is None:
+            return None
+        start, end = self.ptr[term_id], self.ptr[term_id + 1]
+        return self.docs[start:end], self.weights[start:end]
+
+    def top_k(self, query_tokens, k, candidates=None):
+        """k najlepszych dokumentów; candidates - posortowana tablica doc_idx z filtrów"""
+        postings = [p for p in map(self.posting, query_tokens) if p is not None]
+        if not postings or k <= 0:
+            return []
+        docs = np.concatenate([docs for docs, _ in postings])
+        weights = np.concatenate([weights for _, weights in postings])
+        if candidates is not None:
+            keep = np.isin(docs, candidates)
+            docs, weights = docs[keep], weights[keep]
+        if len(docs) >= BROAD_COVERAGE * self.N:
+            # szerokie zapytanie - tablica na cały korpus jest tańsza niż sortowanie postingów
+            scores = np.bincount(docs, weights=weights, minlength=self.N)
+            hits = np.flatnonzero(scores > 0)
+            scores = scores[hits]
+        else:
+            # wyniki tylko dotkniętych dokumentów - bincount po numerach z unique
+            hits, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights, minlength=len(hits))
+            positive = scores > 0
+            hits, scores = hits[positive], scores[positive]
+        metrics.DOCUMENTS_SCORED.observe(len(hits))
+        return _top_scored(hits, scores, k)
+
+    def search(self, query, top_n=25, candidates=None):
+        """query - CompiledQuery (TfidfModel.compile_query)"""
+        return self.top_k(query.tokens, top_n, candidates)
+
+
+class MappedTfidfModel(TfidfModel):
+    """model z pliku indeksu zbudowanego przez data_prep - bez liczenia tf-idf przy starcie
+
+    Tablice są widokami na mmap pliku, więc workery gunicorna współdzielą
+    te same strony pamięci. W pamięci procesu jest tylko słownik tokenów.
+    """
+
+    def __init__(self, arrays, version=None):
+        self.version = version
+        self.row_ids = arrays['row_ids']
+        self.doc_ids = StringTable(arrays['doc_id_offsets'], arrays['doc_id_bytes'])
+        self.vocabulary = list(StringTable(arrays['vocab_offsets'], arrays['vocab_bytes']))
+        self.df_counts = dict(zip(self.vocabulary, arrays['df'].tolist()))
+        self.N = len(self.row_ids)
+        self.index = MappedIndex(self.vocabulary, arrays['postings_ptr'], arrays['postings_docs'],
+                                 arrays['postings_weights'], arrays['max_weights'], self.N)
+        self.similarity = SimilarityEngine.from_arrays(self.vocabulary, arrays['doc_indptr'], arrays['doc_terms'],
+                                                       arrays['doc_weights'], arrays['sq_sums'], arrays['norms'])
+        self._init_query_cache()
+
+    def candidates(self, row_ids):
+        """posortowana tablica indeksów dokumentów dla rowid z filtrów (None = bez ograniczeń)"""
+        if row_ids is None:
+            return None
+        row_ids = np.fromiter(row_ids, dtype=np.int64)
+        pos = np.searchsorted(self.row_ids, row_ids)
+        valid = pos < self.N
+        pos, row_ids = pos[valid], row_ids[valid]
+        return np.unique(pos[self.row_ids[pos] == row_ids])
+
+
+def load_mapped_model(version=None):
+    """model z pliku indeksu; None, gdy pliku nie ma, ma inny format albo jest z innej wersji bazy"""
+    try:
+        header, arrays = read_index(index_path(utils.DB_PATH))
+        if header['db_signature'] != db_signature(utils.DB_PATH):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return MappedTfidfModel(arrays, version)
+
+
+@versioned_cache('tfidf_model')
+def get_tfidf_model(version):
+    """model współdzielony przez wszystkie requesty, przebudowywany tylko po zmianie apartments_sale.db"""
+    with metrics.stage('model_load'):
+        # plik indeksu z data_prep, a gdy go nie ma lub jest nieaktualny - budowa w pamięci
+        model = load_mapped_model(version)
+        if model is None:
+            row_ids, doc_ids, documents = load_documents_cached(version)
+            model = TfidfModel(row_ids, doc_ids, documents, version)
+    return model
@@ -0,0 +1,52 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import profiling
+
+# ========== ETAPY STRONY (ASYNC) ==========
+
+# Etapy strony (wyszukiwanie, wykresy, statystyki, opis miasta) to zwykłe
+# funkcje blokujące - widok async uruchamia je we wspólnej puli wątków i
+# czeka na wszystkie naraz. Każdy wątek ma własne połączenie tylko do odczytu
+# (utils.get_read_connection), więc etapy nie dzielą kursorów.
+
+STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', 16))
+
+_stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='stage')
+logger = logging.getLogger(__name__)
+
+
+async def run_stage(fn, *args, timeout=None):
+    """fn(*args) w puli etapów; asyncio.TimeoutError po timeout sekundach
+
+    Wątek dostaje kopię kontekstu (jak w asyncio.to_thread), więc pomiary
+    z metrics.stage trafiają do Server-Timing bieżącego requestu, a przy
+    profilowanym requeście etap ma własny profil (profiling.wrap).
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, profiling.wrap(fn), *args)
+    return await asyncio.wait_for(loop.run_in_executor(_stage_executor, call), timeout)
+
+
+async def run_panel(name, fn, *args, timeout=None, fallback=None, degraded=None):
+    """etap jednego panelu strony - po przekroczeniu czasu albo błędzie zwraca fallback
+
+    Nazwa etapu trafia wtedy do listy degraded. Wątku nie da się przerwać:
+    spóźniony etap kończy pracę w tle, a jego wynik jest odrzucany.
+    """
+    try:
+        with metrics.stage(name):
+            return await run_stage(fn, *args, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning('etap %s: przekroczony czas %s s', name, timeout)
+    except Exception:
+        logger.exception('etap %s: błąd', name)
+    metrics.DEGRADED_PANELS.inc(name)
+    if degraded is not None:
+        degraded.append(name)
+    return fallback
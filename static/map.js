@@ -0,0 +1,57 @@
+// Mapa wyników: Leaflet ładowany raz (statyczny plik), punkty i klastry wbudowane w stronę (#map-data)
+document.addEventListener('DOMContentLoaded', function() {
+    const container = document.getElementById('map');
+    if (!container) {
+        return;
+    }
+
+    const map = L.map(container);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        maxZoom: 19,
+        attribution: '&copy; OpenStreetMap'
+    }).addTo(map);
+    const layer = L.layerGroup().addTo(map);
+    // te same wiersze co lista wyników - serwer liczy je raz razem ze stroną
+    const data = JSON.parse(document.getElementById('map-data').textContent);
+
+    function formatPrice(price) {
+        return String(price).replace(/\B(?=(\d{3})+(?!\d))/g, ' ');
+    }
+
+    function pointMarker(feature, latlng) {
+        const p = feature.properties;
+        if (!p.count) {
+            return L.marker(latlng).bindPopup(
+                'Nr: ' + p.num + '<br>Cena: ' + formatPrice(p.price) + ' zł<br>Pokoje: ' + p.rooms,
+                {maxWidth: 300, minWidth: 150});
+        }
+        // klaster - kliknięcie przybliża do obszaru jego punktów
+        const marker = L.marker(latlng, {
+            icon: L.divIcon({html: String(p.count), className: 'map-cluster', iconSize: [40, 40]})
+        });
+        const bbox = feature.bbox;
+        marker.on('click', function() {
+            map.fitBounds([[bbox[1], bbox[0]], [bbox[3], bbox[2]]], {padding: [20, 20]});
+        });
+        return marker;
+    }
+
+    // klastry danego zoomu są już policzone na serwerze, tu tylko podmiana warstwy
+    function render() {
+        const zoom = Math.max(map.getZoom(), data.min_zoom);
+        const clusters = zoom > data.max_cluster_zoom ? [] : data.clusters[zoom].features;
+        const clustered = new Set();
+        clusters.forEach(function(feature) {
+            feature.properties.nums.forEach(function(num) { clustered.add(num); });
+        });
+        const points = data.points.features.filter(function(feature) {
+            return !clustered.has(feature.properties.num);
+        });
+        layer.clearLayers();
+        L.geoJSON(clusters.concat(points), {pointToLayer: pointMarker}).addTo(layer);
+    }
+
+    map.fitBounds(L.geoJSON(data.points).getBounds(), {maxZoom: 15, padding: [20, 20]});
+    map.on('zoomend', render);
+    render();
+});
@@ -0,0 +1,100 @@
+"""Profilowanie requestów (profiling.py) na małej bazie syntetycznej.
+
+Uruchomienie z katalogu głównego repo:
+    python -m unittest discover tests
+"""
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# bez pobierania opisu miasta z Wikipedii w tle
+os.environ.setdefault('WIKI_REFRESH', '0')
+
+import profiling
+import utils
+from app import app
+from benchmarks.synthetic import build_database
+
+
+class ProfiledRequestTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.workdir, 'apartments_sale.db')
+        build_database(cls.db_path, rows=300)
+        cls.old_db_path, utils.DB_PATH = utils.DB_PATH, cls.db_path
+
+    @classmethod
+    def tearDownClass(cls):
+        utils.DB_PATH = cls.old_db_path
+        shutil.rmtree(cls.workdir)
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp(dir=self.workdir)
+        app.config.update(PROFILE_REQUESTS=True, PROFILE_DIR=self.profile_dir, PROFILE_KEEP=50)
+        self.client = app.test_client()
+
+    def profiled_index(self):
+        return self.client.post('/', data={'search': 'balkon winda', 'min_rooms': '2'},
+                                headers={profiling.PROFILE_HEADER: '1'})
+
+    def functions(self, response):
+        stats = pstats.Stats(os.path.join(self.profile_dir, response.headers['X-Profile-File']))
+        return {name for _, _, name in stats.stats}
+
+    def test_profiled_index(self):
+        response = self.profiled_index()
+        self.assertEqual(response.status_code, 200)
+        # widok i etapy z puli wątków w jednym pliku
+        functions = self.functions(response)
+        self.assertIn('index', functions)
+        self.assertIn('run_search', functions)
+        self.assertIn('create_charts', functions)
+
+        base = os.path.join(self.profile_dir, response.headers['X-Profile-File'][:-len('.prof')])
+        with open(base + '.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.assertEqual(meta['endpoint'], 'index')
+        self.assertEqual(meta['query'], 'balkon winda')
+        self.assertEqual(meta['all_threads'], not profiling.PER_THREAD)
+        self.assertTrue(os.path.exists(base + '.txt'))
+
+    def test_profiled_requests_one_after_another(self):
+        first, second = self.profiled_index(), self.profiled_index()
+        self.assertNotEqual(first.headers['X-Profile-File'], second.headers['X-Profile-File'])
+        self.assertEqual(len(os.listdir(self.profile_dir)), 6)
+
+    def test_streamed_response_profiled_after_close(self):
+        response = self.client.get('/api/search', query_string={'min_rooms': 2, 'profile': 1})
+        self.assertEqual(response.status_code, 200)
+        response.get_data()
+        response.close()
+        self.assertIn('ndjson_lines', self.functions(response))
+
+    def test_busy_profiler_serves_request_unprofiled(self):
+        # inny request jest właśnie profilowany
+        with profiling._active:
+            response = self.profiled_index()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-File', response.headers)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    def test_enable_error_serves_request_unprofiled(self):
+        # od Pythona 3.12 enable() rzuca ValueError, gdy sys.monitoring zajmuje inne narzędzie
+        error = ValueError('Another profiling tool is already active')
+        with mock.patch.object(profiling.cProfile.Profile, 'enable', side_effect=error), \
+                self.assertLogs('profiling', 'WARNING'):
+            response = self.profiled_index()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+        # blokada zwolniona - następny request ma profil
+        self.assertIn('X-Profile-File', self.profiled_index().headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,42 +1,127 @@
+import json
 import math
+import os
 import sqlite3
+import threading
 import io
+from pathlib import Path
 import base64
-import folium
-from folium.plugins import MarkerCluster
-import matplotlib
-from collections import Counter
-from functools import lru_cache
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import hashlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+import metrics
+import profiling
 from lemmatization import lemmatize_text
+from market_stats import read_district_stats, read_market_stats
 
 # ========== BAZA DANYCH I LOGIKA ==========
 
-def get_db_connection():
-    conn = sqlite3.connect('apartments_sale.db')
+DB_PATH = os.environ.get('APARTMENTS_DB', 'apartments_sale.db')
+
+# strojenie połączeń tylko do odczytu
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024))
+SQLITE_CACHED_STATEMENTS = 256
+
+_local = threading.local()
+
+def get_read_connection():
+    """połączenie tylko do odczytu, jedno na wątek, otwierane ponownie po zmianie bazy
+
+    Nie zamykać - jest używane przez kolejne requesty obsługiwane przez ten wątek.
+    Przygotowane zapytania są cache'owane przez sqlite3 per połączenie
+    (cached_statements), więc powtarzane zapytania nie są kompilowane od nowa.
+    """
+    key = (DB_PATH, get_db_version())
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.key == key:
+        return conn
+    if conn is not None:
+        conn.close()
+    
+    uri = Path(DB_PATH).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, cached_statements=SQLITE_CACHED_STATEMENTS)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    
+    _local.conn = conn
+    _local.key = key
     return conn
 
+def get_db_version():
+    """sygnatura pliku bazy - zmienia się przy każdym przebiegu data_prep"""
+    version = []
+    for path in (DB_PATH, DB_PATH + '-wal'):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        version.append((path, st.st_mtime_ns, st.st_size, st.st_ino))
+    return tuple(version)
+
+def versioned_cache(name):
+    """dekorator: build(version) liczone raz na wersję bazy i współdzielone przez wątki
+
+    Udekorowana funkcja nie ma argumentów - sama sprawdza get_db_version() i
+    przebudowuje obiekt tylko po zmianie bazy, pod blokadą, więc równoległe
+    requesty nie budują go kilka razy. Trafienia trafiają do metryk cache jako name.
+    """
+    def decorator(build):
+        lock = threading.Lock()
+        # (wersja, obiekt) - jedna krotka, więc odczyt bez blokady widzi spójną parę
+        entry = None
+
+        @wraps(build)
+        def get():
+            nonlocal entry
+            version = get_db_version()
+            cached = entry
+            if cached is not None and cached[0] == version:
+                metrics.cache_access(name, True)
+                return cached[1]
+
+            with lock:
+                # inny wątek mógł już przebudować obiekt
+                rebuild = entry is None or entry[0] != version
+                metrics.cache_access(name, not rebuild)
+                if rebuild:
+                    entry = (version, build(version))
+                return entry[1]
+
+        return get
+    return decorator
+
 @lru_cache(maxsize=1)
-def load_documents_cached():
-    conn = get_db_connection()
+def load_documents_cached(version=None):
+    # version tylko unieważnia cache po zmianie bazy
+    conn = get_read_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT id, document FROM apartments')
+    cursor.execute('SELECT rowid, id, document FROM apartments ORDER BY rowid')
     rows = cursor.fetchall()
-    conn.close()
     
+    row_ids = [row['rowid'] for row in rows]
     ids = [row['id'] for row in rows]
     documents = [row['document'] for row in rows]
-    return ids, documents
+    return row_ids, ids, documents
 
 def analyze_districts():
     """statystyki ogólne rynku z bazy danych"""
-    conn = get_db_connection()
+    conn = get_read_connection()
+    # tabela market_stats liczona w data_prep - odczyt jednego wiersza
+    stats = read_market_stats(conn)
+    if stats is not None:
+        return stats
+    
+    # starsza baza bez market_stats - liczymy po całej tabeli
     cursor = conn.cursor()
     cursor.execute('SELECT price, squareMeters FROM apartments')
     rows = cursor.fetchall()
-    conn.close()
     
     if not rows:
         return {'avg_price': 0, 'avg_sqm': 0, 'avg_price_per_sqm': 0, 'total_count': 0}
@@ -54,69 +139,197 @@ def analyze_districts():
         'total_count': len(prices)
     }
 
-def get_filtered_apartments(min_rooms=None, min_square=None, max_square=None,
+def get_district_stats():
+    """statystyki per dzielnica z tabeli market_stats"""
+    return read_district_stats(get_read_connection())
+
+VALID_SORT = ['rooms', 'squareMeters', 'floor', 'floorCount', 'price']
+
+def build_filter_conditions(min_rooms=None, min_square=None, max_square=None,
                             min_price=None, max_price=None, min_build_year=None, 
                             max_centre_distance=None, balcony=None, elevator=None, 
                             parking=None, min_floor=None, max_floor_count=None, 
-                            district=None, sort_by=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = 'SELECT * FROM apartments WHERE 1=1'
+                            district=None):
+    """warunki WHERE (łączone przez AND) i ich parametry dla 13 filtrów"""
+    conditions = []
     params = []
     
     if min_rooms is not None:
-        query += ' AND rooms >= ?'
+        conditions.append('rooms >= ?')
         params.append(min_rooms)
     if min_square is not None:
-        query += ' AND squareMeters >= ?'
+        conditions.append('squareMeters >= ?')
         params.append(min_square)
     if max_square is not None:
-        query += ' AND squareMeters <= ?'
+        conditions.append('squareMeters <= ?')
         params.append(max_square)
     if min_price is not None:
-        query += ' AND price >= ?'
+        conditions.append('price >= ?')
         params.append(min_price)
     if max_price is not None:
-        query += ' AND price <= ?'
+        conditions.append('price <= ?')
         params.append(max_price)
     if min_floor is not None:
-        query += ' AND floor >= ?'
+        conditions.append('floor >= ?')
         params.append(min_floor)
     if max_floor_count is not None:
-        query += ' AND floorCount <= ?'
+        conditions.append('floorCount <= ?')
         params.append(max_floor_count)
         
     if min_build_year is not None:
-        query += ' AND buildYear >= ?'
+        conditions.append('buildYear >= ?')
         params.append(min_build_year)
     if max_centre_distance is not None:
-        query += ' AND centreDistance <= ?'
+        conditions.append('centreDistance <= ?')
         params.append(max_centre_distance)
     
     if balcony == 'yes':
-        query += ' AND hasBalcony = "yes"'
+        conditions.append('hasBalcony = "yes"')
     if elevator == 'yes':
-        query += ' AND hasElevator = "yes"'
+        conditions.append('hasElevator = "yes"')
     if parking == 'yes':
-        query += ' AND hasParkingSpace = "yes"'
+        conditions.append('hasParkingSpace = "yes"')
     
     if district is not None and district != '':
-        query += ' AND district_name = ?'
+        conditions.append('district_name = ?')
         params.append(district)
     
-    valid_sort = ['rooms', 'squareMeters', 'floor', 'floorCount', 'price']
+    return conditions, params
+
+def get_filtered_row_ids(**filters):
+    """rowid mieszkań spełniających filtry albo None, gdy żaden filtr nie jest ustawiony"""
+    conditions, params = build_filter_conditions(**filters)
+    if not conditions:
+        return None
+    
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT rowid FROM apartments WHERE ' + ' AND '.join(conditions), params)
+    row_ids = [row[0] for row in cursor.fetchall()]
+    return row_ids
+
+def build_filter_query(filters, sort_by=None, after=None, limit=50, columns='rowid AS row_id, *'):
+    """zapytanie SELECT dla filtrów z sortowaniem i stronicowaniem keyset
+
+    after to kursor (wartość sort_by, rowid) ostatniego wiersza poprzedniej strony.
+    """
+    conditions, params = build_filter_conditions(**filters)
+    query = f'SELECT {columns} FROM apartments WHERE 1=1' + ''.join(' AND ' + c for c in conditions)
+    
+    if sort_by not in VALID_SORT:
+        sort_by = None
+    
+    if after is not None:
+        value, row_id = after
+        if sort_by is None:
+            query += ' AND rowid > ?'
+            params.append(row_id)
+        elif value is None:
+            # NULL-e są na początku, więc dalej są jeszcze NULL-e o większym rowid i wszystkie nie-NULL
+            query += f' AND ({sort_by} IS NOT NULL OR rowid > ?)'
+            params.append(row_id)
+        else:
+            query += f' AND ({sort_by}, rowid) > (?, ?)'
+            params.extend([value, row_id])
     
-    if sort_by in valid_sort:
-        query += f' ORDER BY {sort_by} ASC'
+    # rowid rozstrzyga remisy, żeby kolejność nie zależała od planu zapytania
+    if sort_by is not None:
+        query += f' ORDER BY {sort_by} ASC, rowid ASC'
+    else:
+        query += ' ORDER BY rowid ASC'
     
-    query += ' LIMIT 50'
+    query += f' LIMIT {int(limit)}'
+    return query, params
+
+def get_filtered_apartments(min_rooms=None, min_square=None, max_square=None,
+                            min_price=None, max_price=None, min_build_year=None, 
+                            max_centre_distance=None, balcony=None, elevator=None, 
+                            parking=None, min_floor=None, max_floor_count=None, 
+                            district=None, sort_by=None, after=None, limit=50):
+    filters = dict(
+        min_rooms=min_rooms, min_square=min_square, max_square=max_square,
+        min_price=min_price, max_price=max_price, min_build_year=min_build_year,
+        max_centre_distance=max_centre_distance, balcony=balcony, elevator=elevator,
+        parking=parking, min_floor=min_floor, max_floor_count=max_floor_count,
+        district=district)
+    query, params = build_filter_query(filters, sort_by, after, limit)
+    
+    conn = get_read_connection()
+    cursor = conn.cursor()
     cursor.execute(query, params)
     results = cursor.fetchall()
-    conn.close()
     
     return [dict(row) for row in results]
 
+def next_page_cursor(results, sort_by=None, limit=50):
+    """kursor następnej strony albo None, gdy to ostatnia strona"""
+    if len(results) < limit:
+        return None
+    last = results[-1]
+    value = last[sort_by] if sort_by in VALID_SORT else None
+    return (value, last['row_id'])
+
+def encode_cursor(cursor):
+    return json.dumps(list(cursor)) if cursor is not None else ''
+
+def decode_cursor(text):
+    if not text:
+        return None
+    try:
+        value, row_id = json.loads(text)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(value, (int, float, type(None))) or not isinstance(row_id, int):
+        return None
+    return (value, row_id)
+
+# ========== STRUMIENIOWANIE WIERSZY (API) ==========
+
+ROW_FETCH_CHUNK = 500
+
+@lru_cache(maxsize=1)
+def get_apartment_columns(version=None):
+    """nazwy kolumn tabeli apartments; version tylko unieważnia cache po zmianie bazy"""
+    conn = get_read_connection()
+    return [row['name'] for row in conn.execute('PRAGMA table_info(apartments)')]
+
+def select_columns(fields=None, sort_by=None):
+    """lista kolumn SELECT: wszystkie albo tylko fields, zawsze z rowid i kolumną sortowania (do kursora)
+
+    Do SQL trafiają tylko kolumny tabeli z get_apartment_columns() - pola
+    spoza niej (miary podobieństwa z rankingu) dokleja do wierszy wywołujący.
+    """
+    if fields is None:
+        return 'rowid AS row_id, *'
+    table_columns = set(get_apartment_columns(get_db_version()))
+    columns = [name for name in fields if name in table_columns]
+    if sort_by in VALID_SORT and sort_by not in columns:
+        columns.append(sort_by)
+    return ', '.join(['rowid AS row_id'] + [f'"{name}"' for name in columns])
+
+def iter_filtered_apartments(filters, sort_by=None, after=None, limit=50, fields=None):
+    """jak get_filtered_apartments, ale wiersze prosto z kursora SQLite i tylko wybrane kolumny"""
+    query, params = build_filter_query(filters, sort_by, after, limit, select_columns(fields, sort_by))
+    cursor = get_read_connection().execute(query, params)
+    for row in cursor:
+        yield dict(row)
+
+def iter_rows(row_ids, fields=None, sort_by=None):
+    """wiersze dla row_ids w tej samej kolejności, pobierane partiami po ROW_FETCH_CHUNK
+
+    Wierszy, których już nie ma w bazie, generator nie zwraca.
+    """
+    conn = get_read_connection()
+    columns = select_columns(fields, sort_by)
+    for start in range(0, len(row_ids), ROW_FETCH_CHUNK):
+        chunk = row_ids[start:start + ROW_FETCH_CHUNK]
+        placeholders = ','.join(['?'] * len(chunk))
+        cursor = conn.execute(f'SELECT {columns} FROM apartments WHERE rowid IN ({placeholders})', chunk)
+        rows = {row['row_id']: dict(row) for row in cursor}
+        for row_id in chunk:
+            if row_id in rows:
+                yield rows[row_id]
+
 # ========== TF-IDF I PODOBIEŃSTWA ==========
 
 def preprocess_query(query):
@@ -170,162 +383,132 @@ def compute_tfidf(documents):
     
     return tfidf_docs, tokenized_docs, df_counts, N
 
-def search_tfidf(query, documents, tfidf_docs, top_n=25):
-    query = preprocess_query(query)
-    query_tokens = lemmatize_text(query).split()
-    scores = []
-    
-    for idx, doc_tfidf in enumerate(tfidf_docs):
-        score = sum(doc_tfidf.get(token, 0) for token in query_tokens)
-        if score > 0:
-            scores.append((idx, score))
-    
-    scores.sort(key=lambda x: x[1], reverse=True)
-    return [i for i, _ in scores[:top_n]]
-
-def cosine_similarity(vec1, vec2):
-    all_tokens = set(vec1.keys()) | set(vec2.keys())
-    dot_product = sum(vec1.get(t, 0) * vec2.get(t, 0) for t in all_tokens)
-    mag1 = math.sqrt(sum(v**2 for v in vec1.values()))
-    mag2 = math.sqrt(sum(v**2 for v in vec2.values()))
-    if mag1 == 0 or mag2 == 0: 
-        return 0
-    return dot_product / (mag1 * mag2)
-
-def jaccard_similarity(vec1, vec2):
-    all_tokens = set(vec1.keys()) | set(vec2.keys())
-    
-    numerator = sum(vec1.get(t, 0) * vec2.get(t, 0) for t in all_tokens)
-    sum_sq1 = sum(v**2 for v in vec1.values())
-    sum_sq2 = sum(v**2 for v in vec2.values())
-    
-    denominator = sum_sq1 + sum_sq2 - numerator
-    return numerator / denominator if denominator > 0 else 0
+class CompiledQuery:
+    """zapytanie przetworzone raz na request: tokeny po lematyzacji i sklejeniu fraz, wektor tf-idf
 
-def dice_similarity(vec1, vec2):
-    all_tokens = set(vec1.keys()) | set(vec2.keys())
-    
-    numerator = 2 * sum(vec1.get(t, 0) * vec2.get(t, 0) for t in all_tokens)
-    sum_sq1 = sum(v**2 for v in vec1.values())
-    sum_sq2 = sum(v**2 for v in vec2.values())
-    
-    denominator = sum_sq1 * sum_sq2
-    return numerator / denominator if denominator > 0 else 0
+    Wszystkie funkcje liczące wyniki i podobieństwa biorą ten obiekt zamiast
+    tekstu, więc zapytanie nie jest normalizowane osobno dla każdego wyniku.
+    """
+    __slots__ = ('text', 'tokens', 'tfidf', 'sq_sum')
 
-def calculate_similarity_for_doc(query, doc_tfidf, doc_tokens_set, df_counts, N):
-    # obliczenie tf-idf dla query takie samo jak dla dokumentów
-    processed_query = preprocess_query(query) 
-    query_tokens = lemmatize_text(processed_query).split()
-    
+    def __init__(self, text, tokens, tfidf):
+        self.text = text
+        self.tokens = tokens
+        self.tfidf = tfidf
+        self.sq_sum = sum(v**2 for v in tfidf.values())
+
+def query_tfidf(query_tokens, df_counts, N):
+    """wektor tf-idf zapytania liczony tak samo jak dla dokumentów"""
     tf_counts = Counter(query_tokens)
     max_tf = max(tf_counts.values()) if tf_counts else 1
-    
-    query_tfidf = {
+    return {
         token: (tf / max_tf) * math.log10(N / df_counts.get(token, N))
         for token, tf in tf_counts.items()
     }
-    
-    return {
-        'cosine': cosine_similarity(query_tfidf, doc_tfidf),
-        'jaccard': jaccard_similarity(query_tfidf, doc_tfidf),
-        'dice': dice_similarity(query_tfidf, doc_tfidf)
-    }
+
+def compile_query(query, df_counts=None, N=None):
+    """CompiledQuery z tekstu; bez df_counts - same tokeny (pusty wektor)"""
+    # jedna lematyzacja: preprocess_query zwraca już lematy, a wynik
+    # lemmatize_text jest lematem samego siebie, więc druga niczego nie zmieniała
+    tokens = tuple(preprocess_query(query).split())
+    tfidf = query_tfidf(tokens, df_counts, N) if df_counts is not None else {}
+    return CompiledQuery(query, tokens, tfidf)
 
 # ========== WIZUALIZACJE ==========
 
-def create_charts(results):
-    charts = {}
-    if not results:
-        return charts
-    
-    prices = [r['price'] for r in results if r.get('price') is not None]
-    if not prices:
-        return charts
+CHART_CACHE_SIZE = 128
 
-    # histogram cen
-    plt.figure(figsize=(10, 6))
-    prices = [r['price'] for r in results]
-    plt.hist(prices, bins=15, color='steelblue', edgecolor='black')
-    plt.xlabel('Cena (zł)')
-    plt.ylabel('Liczba ofert')
-    ax = plt.gca()
-    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x):,}'.replace(',', ' ')))
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+_chart_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='charts')
+
+def _thousands(x, p):
+    return f'{int(x):,}'.replace(',', ' ')
+
+def _figure_to_base64(fig):
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    charts['price_hist'] = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-    
+    fig.savefig(buf, format='png', dpi=100)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+def _price_hist_chart(prices):
+    # histogram cen
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.hist(prices, bins=15, color='steelblue', edgecolor='black')
+    ax.set_xlabel('Cena (zł)')
+    ax.set_ylabel('Liczba ofert')
+    ax.xaxis.set_major_formatter(FuncFormatter(_thousands))
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return _figure_to_base64(fig)
+
+def _scatter_chart(squares, prices):
     # scatter plot
-    plt.figure(figsize=(10, 6))
-    squares = [r['squareMeters'] for r in results]
-    plt.scatter(squares, prices, alpha=0.6, color='coral', s=50)
-    plt.xlabel('Metraż (m²)')
-    plt.ylabel('Cena (zł)')
-    plt.grid(alpha=0.3)
-    ax = plt.gca()
-    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{int(x):,}'.replace(',', ' ')))
-    plt.tight_layout()
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    charts['scatter'] = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-    
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.scatter(squares, prices, alpha=0.6, color='coral', s=50)
+    ax.set_xlabel('Metraż (m²)')
+    ax.set_ylabel('Cena (zł)')
+    ax.grid(alpha=0.3)
+    ax.yaxis.set_major_formatter(FuncFormatter(_thousands))
+    fig.tight_layout()
+    return _figure_to_base64(fig)
+
+def _rooms_bar_chart(rooms):
     # bar chart pokoi
-    plt.figure(figsize=(10, 6))
-    rooms_count = Counter([r['rooms'] for r in results])
-    rooms_sorted = sorted(rooms_count.items())
-    
-    plt.bar([str(int(r)) for r, _ in rooms_sorted], 
-            [c for _, c in rooms_sorted], 
-            color='lightgreen', edgecolor='black', width=0.6)
-    plt.xlabel('Liczba pokoi')
-    plt.ylabel('Liczba ofert')
-    plt.tight_layout()
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    charts['rooms_bar'] = base64.b64encode(buf.read()).decode('utf-8')
-    plt.close()
-    
-    return charts
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    rooms_sorted = sorted(Counter(rooms).items())
+    ax.bar([str(int(r)) for r, _ in rooms_sorted], 
+           [c for _, c in rooms_sorted], 
+           color='lightgreen', edgecolor='black', width=0.6)
+    ax.set_xlabel('Liczba pokoi')
+    ax.set_ylabel('Liczba ofert')
+    fig.tight_layout()
+    return _figure_to_base64(fig)
 
-def create_map(results):
-    # mapa Folium
-    if not results:
-        return None
-    
-    locs = [(r['latitude'], r['longitude'], r['price'], r['rooms'], i+1) 
-            for i, r in enumerate(results) 
-            if r.get('latitude') is not None and r.get('longitude') is not None 
-            and r.get('price') is not None and r.get('rooms') is not None]
-    
-    if not locs:
-        return None
+def create_charts(results):
+    """trzy wykresy PNG (base64) renderowane równolegle na osobnych obiektach Figure
 
-    lat_avg = sum([x[0] for x in locs]) / len(locs)
-    lon_avg = sum([x[1] for x in locs]) / len(locs)
-    
-    m = folium.Map(location=[lat_avg, lon_avg], zoom_start=12)
+    Bez globalnego stanu pyplot, więc bezpieczne przy serwerze wielowątkowym.
+    Wynik jest cache'owany po hashu rysowanych danych (ceny, metraże, pokoje).
+    """
+    charts = {}
+    if not results:
+        return charts
     
-    # grupowanie z MarkerCluster
-    marker_cluster = MarkerCluster().add_to(m)
+    if not any(r.get('price') is not None for r in results):
+        return charts
     
-    for lat, lon, price, rooms, num in locs:
-        popup_text = f"Nr: {num}<br>Cena: {int(price):,} zł<br>Pokoje: {int(rooms)}".replace(',', ' ')
-        popup = folium.Popup(popup_text, max_width=300, min_width=150)
-        folium.Marker([lat, lon], popup=popup).add_to(marker_cluster)
+    prices = [r['price'] for r in results]
+    squares = [r['squareMeters'] for r in results]
+    rooms = [r['rooms'] for r in results]
+    key = hashlib.sha1(repr((prices, squares, rooms)).encode('utf-8')).hexdigest()
+    
+    with _chart_cache_lock:
+        cached = _chart_cache.get(key)
+        if cached is not None:
+            _chart_cache.move_to_end(key)
+    metrics.cache_access('charts', cached is not None)
+    if cached is not None:
+        return dict(cached)
+    
+    # wątki wykresów nie dziedziczą kontekstu - profil requestu dołączany jawnie
+    futures = {
+        'price_hist': _chart_executor.submit(profiling.wrap(_price_hist_chart), prices),
+        'scatter': _chart_executor.submit(profiling.wrap(_scatter_chart), squares, prices),
+        'rooms_bar': _chart_executor.submit(profiling.wrap(_rooms_bar_chart), rooms),
+    }
+    charts = {name: future.result() for name, future in futures.items()}
     
-    return m._repr_html_()
+    with _chart_cache_lock:
+        _chart_cache[key] = charts
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return dict(charts)
 
 def get_all_districts():
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT DISTINCT district_name 
@@ -334,5 +517,4 @@ def get_all_districts():
         ORDER BY district_name
     """)
     districts = [row['district_name'] for row in cursor.fetchall()]
-    conn.close()
     return districts
\ No newline at end of file
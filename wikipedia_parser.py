@@ -1,66 +1,242 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import json
+import os
 import re
-from functools import lru_cache
+import threading
+import time
 
-def parse_wroclaw_wiki():    
-    fallback_pl = {
-        'text': 'Wrocław - miasto na prawach powiatu w południowo-zachodniej Polsce, siedziba władz województwa dolnośląskiego, czwarte co do zaludnienia miasto w Polsce.',
-        'population': '672545',
-        'area': '293'
-    }
-    
-    data = {'pl': fallback_pl.copy()}
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+
+import metrics
+
+WIKI_URL = 'https://pl.wikipedia.org/wiki/Wrocław'
+FETCH_TIMEOUT = 10
+
+# statystyki z Wikipedii trzymane w pliku, odświeżane tylko w wątku w tle
+CACHE_PATH = os.environ.get('WIKI_CACHE', 'wiki_cache.json')
+CACHE_TTL = int(os.environ.get('WIKI_CACHE_TTL', 24 * 3600))
+# WIKI_REFRESH=0 - bez pobierania (offline), tylko plik cache albo wartości domyślne
+REFRESH_ENABLED = os.environ.get('WIKI_REFRESH', '1') != '0'
+# ponowna próba po nieudanym pobraniu
+RETRY_INTERVAL = 600
+
+FALLBACK_PL = {
+    'text': 'Wrocław - miasto na prawach powiatu w południowo-zachodniej Polsce, siedziba władz województwa dolnośląskiego, czwarte co do zaludnienia miasto w Polsce.',
+    'population': '672545',
+    'area': '293'
+}
+
+# ciekawostki
+INTERESTING_FACTS_PL = [
+    'Miasto 12 wysp - Wrocław leży na 12 wyspach połączonych ponad 100 mostami',
+    'Stolica krasnali - ponad 1000 małych figurek krasnali rozmieszczonych po całym mieście',
+    'Ostrów Tumski - najstarsza część miasta, zaczątki Wrocławia z X wieku',
+    'Europejska Stolica Kultury 2016',
+    'Hala Stulecia - obiekt UNESCO z 1913 roku'
+]
+
+
+# ========== PARSOWANIE ==========
+
+# liczba z odstępami tysięcy w jednej linii (bez \n - kolejne wartości infoboksu są w osobnych liniach)
+NUMBER = r'\d{1,3}(?:[ \xa0\u202f]\d{3})+|\d+'
+
+
+def _lead_section(html):
+    """wstęp artykułu: od treści do pierwszego nagłówka sekcji (infoboks i pierwsze akapity)"""
+    start = html.find('id="mw-content-text"')
+    start = max(start, 0)
+    end = html.find('<h2', start)
+    return html[start:end] if end != -1 else html[start:]
+
+
+def _infobox_value(infobox, labels):
+    """tekst komórki wiersza infoboksu, którego nagłówek zawiera któreś z labels"""
+    for row in infobox.find_all('tr'):
+        header, value = row.find('th'), row.find('td')
+        if header is None or value is None:
+            continue
+        if any(label in header.get_text(' ').lower() for label in labels):
+            return value.get_text('\n')
+    return None
+
+
+def parse_wiki_html(html):
+    """opis, populacja i powierzchnia z HTML artykułu; brakujące pola z FALLBACK_PL
+
+    Parsowany jest tylko wstęp artykułu i tylko tabele i akapity
+    (SoupStrainer), a nie całe drzewo strony.
+    """
+    data = FALLBACK_PL.copy()
+    soup = BeautifulSoup(_lead_section(html), 'html.parser', parse_only=SoupStrainer(['table', 'p']))
+
+    texts = []
+    for p in soup.find_all('p'):
+        # akapity z infoboksu to nie opis
+        if p.find_parent('table') is not None:
+            continue
+        text = p.get_text().strip()
+        if len(text) > 60 and not text.startswith('['):
+            clean = re.sub(r'\[.*?\]', '', text)
+            clean = clean.replace('ⓘ', '')
+            texts.append(clean)
+        if len(texts) == 2:
+            break
+    if len(texts) >= 2:
+        data['text'] = ' '.join(texts)
+
+    infobox = soup.find('table', class_='infobox')
+    infobox_text = infobox.get_text('\n') if infobox is not None else ''
+    lead_text = infobox_text + '\n' + ' '.join(texts)
+
+    population = _infobox_value(infobox, ['ludności', 'populacja']) if infobox is not None else None
+    pop = re.search(NUMBER, population) if population else None
+    if pop is None:
+        pop = re.search(rf'(?:{NUMBER})(?=\s+mieszkańc)', lead_text)
+    if pop:
+        data['population'] = re.sub(r'\D', '', pop.group(0))
+
+    area_cell = _infobox_value(infobox, ['powierzchnia']) if infobox is not None else None
+    area = re.search(r'(\d+(?:[,\.]\d+)?)\s*km', area_cell) if area_cell else None
+    if area is None:
+        area = re.search(r'(\d+(?:[,\.]\d+)?)\s*km[²2]', lead_text)
+    if area:
+        data['area'] = area.group(1).replace(',', '.')
+    return data
+
+
+def fetch_wiki_html():
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-    
+    response = requests.get(WIKI_URL, headers=headers, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.text
+
+
+# ========== CACHE W PLIKU ==========
+
+def save_cache(data, path=CACHE_PATH):
+    """zapis przez plik tymczasowy i os.replace - czytelnik nie zobaczy połowy pliku"""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'fetched_at': time.time(), 'data': data}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def cache_age(path=CACHE_PATH):
+    """sekundy od ostatniego zapisu cache, None gdy pliku nie ma"""
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def refresh_cache(path=CACHE_PATH):
+    """pobranie i sparsowanie artykułu; przy błędzie zostaje poprzedni plik"""
+    try:
+        save_cache(parse_wiki_html(fetch_wiki_html()), path)
+        return True
+    except Exception:
+        # sieć, HTTP, zapis pliku - zostaje poprzedni cache, wątek działa dalej
+        return False
+
+
+_cached = {'key': None, 'data': None}
+_cached_lock = threading.Lock()
+
+
+def load_cache(path=CACHE_PATH):
+    """statystyki z pliku (ponowny odczyt tylko po zmianie pliku), None gdy brak/uszkodzony"""
     try:
-        response = requests.get("https://pl.wikipedia.org/wiki/Wrocław", headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        all_paragraphs = soup.find_all('p')
-        texts = []
-        for p in all_paragraphs:
-            text = p.get_text().strip()
-            if len(text) > 60 and not text.startswith('['):
-                clean = re.sub(r'\[.*?\]', '', text)
-                clean = clean.replace('ⓘ', '')
-                texts.append(clean)
-        
-        if len(texts) >= 2:
-            data['pl']['text'] = ' '.join(texts[:2])
-        
-        full_text = soup.get_text()
-        
-        pop = re.search(r'(\d+(?:\s+\d+)*)\s+mieszkańc', full_text)
-        if pop:
-            data['pl']['population'] = pop.group(1).replace(' ', '')
-        
-        area = re.search(r'(\d+(?:[,\.]\d+)?)\s*km[²2]', full_text)
-        if area:
-            data['pl']['area'] = area.group(1).replace(',', '.')
-            
-    except Exception as e:
-        pass
-    
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+    with _cached_lock:
+        hit = _cached['key'] == key
+        data = _cached['data']
+    metrics.cache_access('wiki', hit)
+    if hit:
+        return data
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)['data']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    with _cached_lock:
+        _cached['key'], _cached['data'] = key, data
     return data
 
 
-@lru_cache(maxsize=1)
-def get_city_description():
-    wiki_data = parse_wroclaw_wiki()
-    
-    # ciekawostki
-    interesting_facts_pl = [
-        'Miasto 12 wysp - Wrocław leży na 12 wyspach połączonych ponad 100 mostami',
-        'Stolica krasnali - ponad 1000 małych figurek krasnali rozmieszczonych po całym mieście',
-        'Ostrów Tumski - najstarsza część miasta, zaczątki Wrocławia z X wieku',
-        'Europejska Stolica Kultury 2016',
-        'Hala Stulecia - obiekt UNESCO z 1913 roku'
-    ]
-    
+# ========== ODŚWIEŻANIE W TLE ==========
+
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+
+def _refresh_loop(path, ttl):
+    while True:
+        age = cache_age(path)
+        if age is None or age >= ttl:
+            wait = ttl if refresh_cache(path) else RETRY_INTERVAL
+        else:
+            # np. inny worker odświeżył plik - czekamy do jego wygaśnięcia
+            wait = ttl - age
+        time.sleep(wait)
+
+
+def start_background_refresh(path=CACHE_PATH, ttl=CACHE_TTL):
+    """wątek odświeżający cache, jeden na proces (worker po fork uruchamia własny)"""
+    global _refresher_pid
+    with _refresher_lock:
+        if _refresher_pid == os.getpid():
+            return
+        _refresher_pid = os.getpid()
+    threading.Thread(target=_refresh_loop, args=(path, ttl), name='wiki-refresh', daemon=True).start()
+
+
+def get_city_description(path=CACHE_PATH):
+    """opis miasta z pliku cache - bez sieci na ścieżce requestu
+
+    Gdy pliku jeszcze nie ma (pierwsze uruchomienie), zwracane są wartości
+    domyślne, a artykuł pobiera wątek w tle.
+    """
+    if REFRESH_ENABLED:
+        start_background_refresh(path)
+    return _city_description({**FALLBACK_PL, **(load_cache(path) or {})})
+
+
+def fallback_city_description():
+    """opis z wartości domyślnych - panel strony, gdy odczyt cache nie zdążył"""
+    return _city_description(FALLBACK_PL)
+
+
+def _city_description(wiki_data):
     return {
-        'pl': wiki_data['pl']['text'],
-        'population': wiki_data['pl']['population'],
-        'area': wiki_data['pl']['area'],
-        'interesting_facts_pl': interesting_facts_pl
-    }
\ No newline at end of file
+        'pl': wiki_data['text'],
+        'population': wiki_data['population'],
+        'area': wiki_data['area'],
+        'interesting_facts_pl': INTERESTING_FACTS_PL
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--html', help='zapisany HTML artykułu zamiast pobierania (np. fixtures/wroclaw_wiki.html)')
+    parser.add_argument('--cache', default=CACHE_PATH)
+    parser.add_argument('--refresh', action='store_true', help='pobierz artykuł teraz i zapisz cache')
+    args = parser.parse_args()
+
+    if args.html:
+        with open(args.html, encoding='utf-8') as f:
+            data = parse_wiki_html(f.read())
+    elif args.refresh:
+        if not refresh_cache(args.cache):
+            print("nie udało się pobrać artykułu - cache bez zmian")
+        data = load_cache(args.cache)
+    else:
+        data = load_cache(args.cache)
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()